@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List
+from state import load_json, save_json
+
+# Per-backend state files; formatted with the store's name
+ROW_HASHES_FILE = "row_hashes_{}.json"
+PENDING_ROWS_FILE = "pending_rows_{}.json"
+
+# Runs a spooled row is retried in before it is dropped
+MAX_SPOOLED_ATTEMPTS = 5
+
+# Columns that change on every run without the story itself changing
+VOLATILE_COLUMNS = {"published_at"}
+
+
+def row_content_hash(row: Dict[str, Any]) -> str:
+    """Hashes the stable content of a row (everything but volatile columns)."""
+    stable = {key: value for key, value in row.items() if key not in VOLATILE_COLUMNS}
+    return hashlib.sha256(json.dumps(stable, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class BatchedUpserter:
+    """
+    Writes rows to a TransferNewsStore in fixed-size chunks.
+
+    - Rows whose content hash matches the last successful write are skipped.
+    - Each chunk is retried with exponential backoff on transient failures.
+    - Chunks that still fail are spooled to disk and retried on the next run,
+      so a storage hiccup never throws away a finished LLM run.
+
+    `write()` may be called repeatedly as results stream in: the spool from
+    the previous run is retried by the first call, and the spool file always
+    holds every row of this run that is still unsaved.
+    """
+    def __init__(self, store, on_conflict: str = "player_name", chunk_size: int | None = None,
+                 max_retries: int = 3, backoff: float = 1.0):
+        self.store = store
+        self.on_conflict = on_conflict
+        self.chunk_size = chunk_size or int(os.getenv("UPSERT_CHUNK_SIZE", "50"))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.row_hashes_file = ROW_HASHES_FILE.format(store.name)
+        self.pending_rows_file = PENDING_ROWS_FILE.format(store.name)
+        self.row_hashes: Dict[str, str] = load_json(self.row_hashes_file, {})
+        self._spooled: List[Dict[str, Any]] = load_json(self.pending_rows_file, [])
+        # Runs each spooled row has already failed in, by conflict key
+        self._attempts = {entry["row"].get(on_conflict): entry["attempts"] for entry in self._spooled}
+        # Rows of this run that could not be saved, by conflict key
+        self._failed: Dict[Any, Dict[str, Any]] = {}
+
+    def _upsert_chunk(self, chunk: List[Dict[str, Any]]):
+        """Upserts one chunk, retrying transient failures with backoff."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.store.upsert(chunk)
+                return
+            except Exception as e:
+                if attempt == self.max_retries or not self.store.is_transient(e):
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                print(f"Transient error writing transfer_news ({e}); retrying in {delay:.0f}s...")
+                time.sleep(delay)
+
+    @property
+    def unsaved(self) -> int:
+        """Number of rows of this run that are still unsaved (and spooled)."""
+        return len(self._failed)
+
+    def write(self, rows: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Writes rows (plus any spooled from a failed earlier run).
+
+        Returns:
+            Counts of rows "written", "unchanged" (skipped) and "failed".
+        """
+        spooled, self._spooled = self._spooled, []
+        if spooled:
+            print(f"Retrying {len(spooled)} rows spooled by an earlier run.")
+        if not spooled and not rows:
+            return {"written": 0, "unchanged": 0, "failed": 0}
+        # Later rows win, so fresh output replaces stale spooled rows
+        by_key = {}
+        for row in [entry["row"] for entry in spooled] + rows:
+            if not row.get(self.on_conflict):
+                print(f"Skipping row without {self.on_conflict}: {row.get('headline')}")
+                continue
+            by_key[row[self.on_conflict]] = row
+
+        changed = []
+        for key, row in by_key.items():
+            content_hash = row_content_hash(row)
+            if self.row_hashes.get(key) != content_hash:
+                changed.append((key, content_hash, row))
+        stats = {"written": 0, "unchanged": len(by_key) - len(changed), "failed": 0}
+
+        for i in range(0, len(changed), self.chunk_size):
+            chunk = changed[i:i + self.chunk_size]
+            try:
+                self._upsert_chunk([row for _, _, row in chunk])
+            except Exception as e:
+                print(f"Error saving {len(chunk)} rows to transfer_news: {e}")
+                stats["failed"] += len(chunk)
+                for key, _, row in chunk:
+                    attempt = self._attempts.get(key, 0) + 1
+                    if attempt < MAX_SPOOLED_ATTEMPTS:
+                        self._failed[key] = {"row": row, "attempts": attempt}
+                    else:
+                        self._failed.pop(key, None)
+                        print(f"Dropping row '{key}' after {attempt} failed attempts.")
+                continue
+            for key, content_hash, _ in chunk:
+                self.row_hashes[key] = content_hash
+                self._failed.pop(key, None)
+            stats["written"] += len(chunk)
+
+        save_json(self.row_hashes_file, self.row_hashes)
+        save_json(self.pending_rows_file, list(self._failed.values()))
+        return stats
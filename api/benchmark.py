@@ -0,0 +1,523 @@
+"""
+Replay benchmark for the scrape pipeline.
+
+Records real responses from every external service once, then replays them
+through a local stub server (with configurable latency and error injection)
+and measures each pipeline stage at increasing article counts.
+
+Usage:
+    python api/benchmark.py record
+    python api/benchmark.py run --sizes 10,100,1000,10000 --latency-ms 50 --error-rate 0.02
+
+Without a recording, `run` falls back to synthetic fixtures so the harness
+still works offline.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+DEFAULT_RECORDING = Path("benchmark/recordings/recording.json")
+RECORD_PLAYERS = ["Bukayo Saka", "Martin Odegaard", "Declan Rice", "William Saliba", "Viktor Gyokeres"]
+
+# Synthetic fixtures, used for anything missing from the recording
+SYNTHETIC_PLAYERS = [
+    "Bukayo Saka", "Martin Ødegaard", "Declan Rice", "William Saliba", "Gabriel Magalhães",
+    "Kai Havertz", "Viktor Gyökeres", "Eberechi Eze", "Noni Madueke", "Martín Zubimendi"
+]
+
+SYLLABLES = ["ka", "lo", "mi", "ren", "zu", "ta", "vo", "bel", "sa", "ni", "ro", "dak", "fe", "gu", "ji", "pol"]
+
+
+def synthetic_player_name(number: int) -> str:
+    """Generates a deterministic, made-up player name for story `number`."""
+    rng = random.Random(number)
+    first = "".join(rng.choice(SYLLABLES) for _ in range(2)).capitalize()
+    last = "".join(rng.choice(SYLLABLES) for _ in range(3)).capitalize()
+    return f"{first} {last}"
+
+
+# --- RECORDING ---
+
+async def record(path: Path):
+    """Captures live RSS, tweet, LLM and provider responses into one JSON file."""
+    import httpx
+    import requests
+    from newscraper import NewsScraper
+    from llm_processor import LLM_MODELS, _call_model
+    from sports_api_client import SportsApiClient
+
+    recording = {"recorded_at": datetime.now(timezone.utc).isoformat(), "rss": {}, "tweets": {},
+                 "llm": [], "providers": {"api-football": {}, "sportmonks": {}, "thesportsdb": {}, "wikipedia": {},
+                               "wikipedia-titles": {}}}
+    scraper = NewsScraper()
+
+    for source_name, url in scraper.rss_feeds.items():
+        print(f"Recording {source_name}...")
+        recording["rss"][source_name] = requests.get(url, timeout=20).text
+
+    await scraper._login()
+    for username in scraper.journalists:
+        print(f"Recording tweets for {username}...")
+        user = await scraper.client.get_user_by_screen_name(username)
+        tweets = await user.get_tweets('Tweets', count=40)
+        recording["tweets"][username] = {
+            "name": user.name,
+            "screen_name": user.screen_name,
+            "tweets": [
+                {
+                    "id": tweet.id,
+                    "full_text": tweet.full_text,
+                    "reply_to": bool(tweet.reply_to),
+                    "media": [m.media_url_https for m in (tweet.media or []) if getattr(m, "type", None) == "photo"]
+                }
+                for tweet in tweets
+            ]
+        }
+
+    sample = [
+        {"headline": t["full_text"], "source_name": u["name"],
+         "url": f"https://x.com/{u['screen_name']}/status/{t['id']}", "content": t["full_text"], "image_url": None}
+        for u in recording["tweets"].values() for t in u["tweets"][:10]
+    ]
+    async with httpx.AsyncClient() as client:
+        print("Recording an LLM completion...")
+        recording["llm"] = await _call_model(client, LLM_MODELS[0], sample, os.environ.get("OPENROUTER_API_KEY"))
+
+        sports = SportsApiClient()
+        for player_name in RECORD_PLAYERS:
+            print(f"Recording provider responses for {player_name}...")
+            if sports.apifootball_key:
+                response = await client.get(f"{sports.apifootball_base_url}/players",
+                                            headers={'x-apisports-key': sports.apifootball_key},
+                                            params={"search": player_name, "team": "42", "season": "2023"})
+                recording["providers"]["api-football"][player_name] = response.json()
+            if sports.sportmonks_key:
+                response = await client.get(f"{sports.sportmonks_base_url}/players/search/{player_name}",
+                                            params={"api_token": sports.sportmonks_key})
+                recording["providers"]["sportmonks"][player_name] = response.json()
+            response = await client.get(f"{sports.thesportsdb_base_url}/searchplayers.php",
+                                        params={"p": player_name.replace(" ", "_")})
+            recording["providers"]["thesportsdb"][player_name] = response.json()
+            response = await client.get(sports.wikimedia_base_url, headers={'User-Agent': sports.user_agent}, params={
+                "action": "query", "format": "json", "generator": "search",
+                "gsrsearch": f"{player_name} footballer Arsenal", "gsrlimit": 1,
+                "prop": "pageimages|pageprops", "piprop": "thumbnail|name", "pithumbsize": 500,
+                "ppprop": "disambiguation", "formatversion": 2
+            })
+            recording["providers"]["wikipedia"][player_name] = response.json()
+            # The batched title lookup of prefetch_wikipedia_images, one player at a time
+            response = await client.get(sports.wikimedia_base_url, headers={'User-Agent': sports.user_agent}, params={
+                "action": "query", "format": "json", "titles": player_name, "redirects": 1,
+                "prop": "pageimages|pageprops|description", "piprop": "thumbnail|name", "pithumbsize": 500,
+                "ppprop": "disambiguation", "formatversion": 2
+            })
+            recording["providers"]["wikipedia-titles"][player_name] = response.json()
+        await sports.aclose()
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(recording, f, ensure_ascii=False, indent=2)
+    print(f"Recording saved to {path}")
+
+
+# --- FIXTURES ---
+
+class Fixtures:
+    """Turns a recording (or synthetic data) into payloads of any size."""
+    def __init__(self, recording: dict):
+        import feedparser
+        self.recording = recording
+        self.rss_items = []
+        for source_name, xml in recording.get("rss", {}).items():
+            for entry in feedparser.parse(xml).entries:
+                self.rss_items.append({
+                    "title": entry.get("title", ""),
+                    "summary": entry.get("summary", ""),
+                    "thumbnail": (entry.get("media_thumbnail") or [{}])[0].get("url")
+                })
+        if not self.rss_items:
+            self.rss_items = [
+                {"title": f"Arsenal in talks to sign {player}",
+                 "summary": f"Arsenal have opened contract talks over a transfer for {player}.",
+                 "thumbnail": f"https://ichef.bbci.co.uk/ace/standard/240/cps/240/{i}.jpg"}
+                for i, player in enumerate(SYNTHETIC_PLAYERS)
+            ]
+        self.tweets = [t for user in recording.get("tweets", {}).values() for t in user["tweets"] if not t["reply_to"]]
+        if not self.tweets:
+            self.tweets = [
+                {"full_text": f"{player} to Arsenal, here we go! Deal agreed. #AFC", "media": []}
+                for player in SYNTHETIC_PLAYERS
+            ]
+        self._story_numbers = itertools.count()
+        self._lock = threading.Lock()
+        self.stories = recording.get("llm") or [
+            {"player_name": player, "headline": f"Arsenal close in on {player}", "news_summary": "..."}
+            for player in SYNTHETIC_PLAYERS
+        ]
+
+    def rss_xml(self, source_name: str, count: int, seed: int) -> str:
+        """Builds an RSS document with `count` unique items."""
+        now = format_datetime(datetime.now(timezone.utc))
+        items = []
+        for i in range(count):
+            item = self.rss_items[i % len(self.rss_items)]
+            link = f"https://replay.local/{seed}/{escape(source_name)}/{i}"
+            thumbnail = f'<media:thumbnail url="{escape(item["thumbnail"])}"/>' if item["thumbnail"] else ""
+            items.append(
+                f"<item><title>{escape(item['title'])} ({i})</title><link>{link}</link>"
+                f"<description>{escape(item['summary'])}</description><pubDate>{now}</pubDate>{thumbnail}</item>"
+            )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/"><channel>'
+            f"<title>{escape(source_name)}</title>{''.join(items)}</channel></rss>"
+        )
+
+    def tweet_objects(self, username: str, count: int, seed: int):
+        """Builds twikit-like tweet objects with unique ids."""
+        base_id = 1_900_000_000_000_000_000 + seed * 1_000_000
+        now = datetime.now(timezone.utc)
+        tweets = []
+        for i in range(count):
+            tweet = self.tweets[i % len(self.tweets)]
+            text = tweet["full_text"]
+            if "arsenal" not in text.lower():
+                text += " #AFC"
+            tweets.append(SimpleNamespace(
+                id=str(base_id + count - i),
+                full_text=f"{text} ({username} {i})",
+                reply_to=None,
+                created_at_datetime=now,
+                media=[SimpleNamespace(type="photo", media_url_https=url) for url in tweet.get("media", [])],
+                urls=[]
+            ))
+        return tweets
+
+    def completion(self, articles: list) -> str:
+        """
+        Emulates the LLM: about one story per three articles, each built from
+        a recorded story. Beyond the recorded players, stories get generated
+        names distinct enough that each one upserts its own row.
+        """
+        stories = []
+        for i in range(0, len(articles), 3):
+            article = articles[i]
+            with self._lock:
+                story_number = next(self._story_numbers)
+            template = self.stories[story_number % len(self.stories)]
+            player_name = template["player_name"]
+            if story_number >= len(self.stories):
+                player_name = synthetic_player_name(story_number)
+            stories.append(dict(template, player_name=player_name, url=article["url"],
+                                source_name=article["source_name"], image_url=article.get("image_url")))
+        return json.dumps(stories, ensure_ascii=False)
+
+    def provider_response(self, provider: str, player_name: str | None) -> dict:
+        recorded = self.recording.get("providers", {}).get(provider, {})
+        if player_name in recorded:
+            return recorded[player_name]
+        if provider == "api-football":
+            return {"results": 0, "response": [], "paging": {"current": 1, "total": 1}}
+        if provider == "sportmonks":
+            return {"data": []}
+        if provider == "thesportsdb":
+            return {"player": None}
+        return {"query": {"pages": []}}
+
+    def wikipedia_titles_response(self, titles: list) -> dict:
+        """Combines the recorded single-title lookups into one batched MediaWiki response."""
+        query = {"normalized": [], "redirects": [], "pages": []}
+        for title in titles:
+            recorded = self.provider_response("wikipedia-titles", title).get("query", {})
+            for key in query:
+                query[key].extend(recorded.get(key, []))
+        return {"query": query}
+
+
+# --- STUB SERVER ---
+
+class ReplayServer:
+    """
+    Serves fixtures over HTTP with injected latency and errors:
+
+        /rss/<source>              generated RSS feed
+        /openrouter                emulated chat completion
+        /api-football/players      recorded API-Football responses
+        /sportmonks/players/search/<name>
+        /thesportsdb/searchplayers.php
+        /wikipedia                 recorded MediaWiki responses (search or titles)
+    """
+    def __init__(self, fixtures: Fixtures, latency_ms: float, error_rate: float, seed: int = 0):
+        self.fixtures = fixtures
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.rss_size = 0
+        self.run_seed = 0
+        self.requests = {}
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body, content_type="application/json"):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _route(self, method):
+                parsed = urlparse(self.path)
+                route = parsed.path.strip("/").split("/")[0]
+                query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+                with server._lock:
+                    server.requests[route] = server.requests.get(route, 0) + 1
+                    fail = server.random.random() < server.error_rate
+                time.sleep(server.latency)
+                if fail:
+                    return self._reply(429 if route == "openrouter" else 500, '{"error": "injected"}')
+
+                fixtures = server.fixtures
+                if route == "rss":
+                    source_name = parsed.path.split("/", 2)[2]
+                    return self._reply(200, fixtures.rss_xml(source_name, server.rss_size, server.run_seed),
+                                       "application/rss+xml")
+                if route == "openrouter" and method == "POST":
+                    body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                    articles = json.loads(body["messages"][-1]["content"])
+                    completion = {"choices": [{"message": {"content": fixtures.completion(articles)}}]}
+                    return self._reply(200, json.dumps(completion))
+                if route == "api-football":
+                    return self._reply(200, json.dumps(fixtures.provider_response("api-football", query.get("search"))))
+                if route == "sportmonks":
+                    name = unquote(parsed.path.rsplit("/", 1)[-1])
+                    return self._reply(200, json.dumps(fixtures.provider_response("sportmonks", name)))
+                if route == "thesportsdb":
+                    name = (query.get("p") or "").replace("_", " ")
+                    return self._reply(200, json.dumps(fixtures.provider_response("thesportsdb", name)))
+                if route == "wikipedia" and "titles" in query:
+                    titles = query["titles"].split("|")
+                    return self._reply(200, json.dumps(fixtures.wikipedia_titles_response(titles)))
+                if route == "wikipedia":
+                    name = (query.get("gsrsearch") or "").replace(" footballer Arsenal", "")
+                    return self._reply(200, json.dumps(fixtures.provider_response("wikipedia", name)))
+                return self._reply(404, '{"error": "not found"}')
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_POST(self):
+                self._route("POST")
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+
+
+class ReplayTwitterClient:
+    """
+    Stands in for twikit's Client. twikit talks to Twitter's private GraphQL
+    API, so tweets are replayed at the object level rather than over HTTP.
+    """
+    def __init__(self, fixtures: Fixtures, count: int, seed: int, latency: float):
+        self.fixtures = fixtures
+        self.count = count
+        self.seed = seed
+        self.latency = latency
+
+    async def get_user_by_screen_name(self, username):
+        await asyncio.sleep(self.latency)
+        tweets = self.fixtures.tweet_objects(username, self.count, self.seed)
+        latency = self.latency
+
+        class Page(list):
+            async def next(self):
+                await asyncio.sleep(latency)
+                return Page()
+
+        async def get_tweets(tweet_type, count):
+            await asyncio.sleep(latency)
+            return Page(tweets)
+
+        return SimpleNamespace(name=username, screen_name=username, get_tweets=get_tweets)
+
+
+# --- BENCHMARK RUN ---
+
+async def run_pipeline(server: ReplayServer, fixtures: Fixtures, size: int, work_dir: Path, latency: float) -> dict:
+    """
+    Runs the streaming pipeline once against the stub. Stages overlap, so
+    each stage's time is how long after the start it finished.
+    """
+    import state
+    import llm_processor
+    import scrape
+    from newscraper import NewsScraper
+    from player_index import PlayerNameIndex
+    from relevance_classifier import RelevanceClassifier
+    from storage import SQLiteStore
+    from batch_writer import BatchedUpserter
+
+    import metrics
+    metrics.reset()
+    state.STATE_DIR = work_dir / "state"
+    llm_processor.OPENROUTER_URL = f"{server.url}/openrouter"
+    llm_processor.MODEL_STATS.clear()
+
+    scraper = NewsScraper()
+    sources = len(scraper.journalists) + len(scraper.rss_feeds)
+    per_source = max(1, size // sources)
+    server.rss_size = per_source
+    server.run_seed = size
+    scraper.rss_feeds = {name: f"{server.url}/rss/{name}" for name in scraper.rss_feeds}
+    scraper.client = ReplayTwitterClient(fixtures, per_source, size, latency)
+
+    async def no_login():
+        pass
+    scraper._login = no_login
+
+    store = SQLiteStore(str(work_dir / "transfer_news.db"))
+    total_start = time.perf_counter()
+    counts = await scrape.run_pipeline(
+        scraper, store, BatchedUpserter(store), RelevanceClassifier(), PlayerNameIndex(), "replay"
+    )
+    total = round(time.perf_counter() - total_start, 4)
+
+    report = metrics.report()
+    stages = {span["labels"]["stage"]: span["seconds"] for span in report["spans"] if span["name"] == "stage"}
+    first_write = next(
+        (h["sum"] for h in report["histograms"] if h["name"] == "first_write_seconds"), None
+    )
+    return {
+        "articles": counts["scraped"],
+        "relevant": counts["relevant"],
+        "clustered": counts["clustered"],
+        "stories": counts["stories"],
+        "written": counts["written"],
+        "stages": stages,
+        "first_write_seconds": first_write,
+        "total_seconds": total,
+        "counters": report["counters"]
+    }
+
+
+async def run_benchmark(args):
+    recording = {}
+    if args.recording.exists():
+        with open(args.recording, 'r', encoding='utf-8') as f:
+            recording = json.load(f)
+    else:
+        print(f"No recording at {args.recording}; using synthetic fixtures.")
+    fixtures = Fixtures(recording)
+
+    import sports_api_client
+    if not args.provider_rate_limits:
+        # The stub has no quota, so measure the pipeline rather than the waits
+        for provider in sports_api_client.PROVIDER_RATE_LIMITS:
+            sports_api_client.PROVIDER_RATE_LIMITS[provider] = (1_000_000, 1.0)
+
+    # Import the pipeline up front so module loading is not counted as peak memory
+    import scrape  # noqa: F401
+
+    results = []
+    with ReplayServer(fixtures, args.latency_ms, args.error_rate, args.seed) as server:
+        os.environ.update({
+            "API_FOOTBALL_API_KEY": "replay",
+            "API_FOOTBALL_BASE_URL": f"{server.url}/api-football",
+            # Also overrides a real key from .env, so a replay never makes metered calls
+            "SPORTMONKS_API_KEY": "replay",
+            "SPORTMONKS_BASE_URL": f"{server.url}/sportmonks",
+            "THESPORTSDB_BASE_URL": f"{server.url}/thesportsdb",
+            "WIKIMEDIA_BASE_URL": f"{server.url}/wikipedia",
+        })
+        for size in args.sizes:
+            server.requests = {}
+            with tempfile.TemporaryDirectory() as work_dir:
+                tracemalloc.start()
+                output = io.StringIO() if not args.verbose else sys.stdout
+                with contextlib.redirect_stdout(output):
+                    result = await run_pipeline(server, fixtures, size, Path(work_dir), args.latency_ms / 1000)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            result["size"] = size
+            result["peak_memory_mb"] = round(peak / 1024 / 1024, 2)
+            result["stub_requests"] = dict(server.requests)
+            results.append(result)
+            stages = "  ".join(f"{name}={seconds:.2f}s" for name, seconds in result["stages"].items())
+            first_write = result["first_write_seconds"]
+            first_write = f"{first_write:.2f}s" if first_write is not None else "-"
+            print(f"size={size:<6} articles={result['articles']:<6} total={result['total_seconds']:.2f}s  "
+                  f"first_write={first_write}  done: {stages}  peak={result['peak_memory_mb']}MB")
+
+    report = {
+        "latency_ms": args.latency_ms,
+        "error_rate": args.error_rate,
+        "recording": str(args.recording) if recording else None,
+        "results": results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay benchmarks for the scrape pipeline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="Capture live responses from every service.")
+    record_parser.add_argument("--recording", type=Path, default=DEFAULT_RECORDING)
+
+    run_parser = subparsers.add_parser("run", help="Replay the recording through a local stub server.")
+    run_parser.add_argument("--recording", type=Path, default=DEFAULT_RECORDING)
+    run_parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")],
+                            default=[10, 100, 1000, 10000])
+    run_parser.add_argument("--latency-ms", type=float, default=50.0, help="Latency added to every stub request.")
+    run_parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub requests that fail.")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--provider-rate-limits", action="store_true",
+                            help="Keep the real per-provider rate limits.")
+    run_parser.add_argument("--output", help="Write the JSON report to this file.")
+    run_parser.add_argument("--verbose", action="store_true", help="Show pipeline output.")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        asyncio.run(record(args.recording))
+    else:
+        asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
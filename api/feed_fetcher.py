@@ -0,0 +1,80 @@
+import hashlib
+from datetime import datetime, timezone
+import requests
+import metrics
+from state import load_json, save_json
+
+FEED_STATE_FILE = "rss_feeds.json"
+
+
+class ConditionalFeedFetcher:
+    """
+    Fetches RSS feeds with conditional GETs. For each feed URL it remembers
+    the ETag, Last-Modified header and a hash of the last body, so an
+    unchanged feed costs a 304 (or at most a download) but never a parse.
+
+    `fetch()` only returns a feed's new validators; the caller stages them
+    with `stage()` once the feed's articles are safely in the run (not after
+    a timeout or parse error), and `save()` persists them once the run has
+    been stored successfully. A failed run therefore re-reads the same feeds
+    next time instead of silently skipping their articles.
+    """
+    def __init__(self, user_agent, timeout=20.0):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.state = load_json(FEED_STATE_FILE, {})
+        self._pending = {}
+
+    def fetch(self, url):
+        """
+        Fetches a feed body.
+
+        Args:
+            url: The feed URL.
+
+        Returns:
+            A (body, validators) tuple: the raw feed bytes, or None if the
+            feed has not changed since the last saved run, and the validators
+            to `stage()` for this feed, or None if there is nothing new.
+        """
+        previous = self.state.get(url, {})
+        headers = {"User-Agent": self.user_agent}
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+
+        response = requests.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            metrics.increment("rss_fetches", result="not_modified")
+            print(f"Feed {url} not modified (304).")
+            return None, None
+        response.raise_for_status()
+
+        body = response.content
+        content_hash = hashlib.sha256(body).hexdigest()
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_hash": content_hash,
+            "fetched_at": datetime.now(timezone.utc).isoformat()
+        }
+        if content_hash == previous.get("content_hash"):
+            metrics.increment("rss_fetches", result="unchanged")
+            print(f"Feed {url} body unchanged, skipping parse.")
+            return None, validators
+        metrics.increment("rss_fetches", result="changed")
+        return body, validators
+
+    def stage(self, url, validators):
+        """Queues a feed's validators from `fetch()` for the next `save()`."""
+        if validators:
+            self._pending[url] = validators
+
+    def save(self):
+        """Persists the validators collected during this run."""
+        if not self._pending:
+            return
+        self.state.update(self._pending)
+        self._pending = {}
+        save_json(FEED_STATE_FILE, self.state)
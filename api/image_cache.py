@@ -0,0 +1,69 @@
+import os
+import time
+from player_index import normalize_player_name
+from state import load_json, save_json
+
+IMAGE_CACHE_FILE = "player_images.json"
+
+class PlayerImageCache:
+    """
+    A durable cache of resolved player images.
+
+    Maps (normalized player name, team id) to the image URL and the provider
+    that supplied it. "Not found" results are cached too, but expire sooner
+    (`negative_ttl`) so a player who later gets a photo is retried. When the
+    cache grows beyond `max_entries`, the least recently used entries go.
+    """
+    def __init__(self, ttl=None, negative_ttl=None, max_entries=None):
+        self.ttl = ttl or float(os.getenv("IMAGE_CACHE_TTL", str(30 * 24 * 3600)))
+        self.negative_ttl = negative_ttl or float(os.getenv("IMAGE_CACHE_NEGATIVE_TTL", str(24 * 3600)))
+        self.max_entries = max_entries or int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "2000"))
+        self.entries = load_json(IMAGE_CACHE_FILE, {})
+        self._dirty = False
+
+    @staticmethod
+    def make_key(player_name: str, team_id: int | None) -> str:
+        return f"{normalize_player_name(player_name)}|{team_id}"
+
+    def get(self, player_name: str, team_id: int | None):
+        """
+        Looks up a player.
+
+        Returns:
+            A (hit, image_url, provider) tuple. On a cached "not found",
+            hit is True and image_url is None.
+        """
+        key = self.make_key(player_name, team_id)
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None, None
+        ttl = self.ttl if entry["image_url"] else self.negative_ttl
+        now = time.time()
+        if now - entry["stored_at"] > ttl:
+            del self.entries[key]
+            self._dirty = True
+            return False, None, None
+        entry["last_used"] = now
+        self._dirty = True
+        return True, entry["image_url"], entry["provider"]
+
+    def put(self, player_name: str, team_id: int | None, image_url: str | None, provider: str | None):
+        """Records a resolved image (or a "not found" when image_url is None)."""
+        now = time.time()
+        self.entries[self.make_key(player_name, team_id)] = {
+            "image_url": image_url,
+            "provider": provider,
+            "stored_at": now,
+            "last_used": now
+        }
+        self._dirty = True
+
+    def save(self):
+        """Evicts least recently used entries beyond the limit and persists."""
+        if not self._dirty:
+            return
+        if len(self.entries) > self.max_entries:
+            recent = sorted(self.entries.items(), key=lambda item: item[1]["last_used"], reverse=True)
+            self.entries = dict(recent[:self.max_entries])
+        save_json(IMAGE_CACHE_FILE, self.entries)
+        self._dirty = False
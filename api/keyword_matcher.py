@@ -0,0 +1,78 @@
+import re
+from typing import Dict, Iterable, Set
+
+# Letters and digits; anything else (spaces, punctuation, "_", "-", "/") separates words
+_ALNUM = "a-z0-9À-ɏ"
+_NOT_AFTER_ALNUM = f"(?<![{_ALNUM}])"
+_NOT_BEFORE_ALNUM = f"(?![{_ALNUM}])"
+
+
+def _trie_pattern(terms: Iterable[str]) -> str:
+    """
+    Builds a regex alternation factored as a trie ("sign", "signed", "signing"
+    -> "sign(?:ed|ing)?"), so matching a position costs one branch per
+    character rather than one attempt per term. Longer terms are tried first.
+    """
+    trie: Dict = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        ends_here = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not ends_here:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if ends_here else group
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Matches a fixed set of keywords against text in a single pass.
+
+    Keywords are compiled once into one trie-shaped regex, so the cost of a
+    lookup grows with the text rather than with the number of keywords.
+    Matching is case-insensitive, whitespace inside phrases is flexible, and
+    keywords only match at word boundaries (letters and digits form words):
+    whole words by default, or any word starting with the keyword with
+    `prefix=True` ("sign" then matches "signs" and "signing", but never
+    "design"). Keyword ends that are not letters or digits, like "$" or
+    "#afc", need no boundary.
+    """
+    def __init__(self, terms: Iterable[str], prefix: bool = False):
+        self.terms = sorted({" ".join(term.lower().split()) for term in terms if term.strip()})
+        # Group keywords by which boundary checks apply to them
+        groups: Dict[tuple, list] = {}
+        for term in self.terms:
+            left = re.match(f"[{_ALNUM}]", term[0]) is not None
+            right = not prefix and re.match(f"[{_ALNUM}]", term[-1]) is not None
+            groups.setdefault((left, right), []).append(term)
+        alternatives = [
+            (_NOT_AFTER_ALNUM if left else "") + f"(?:{_trie_pattern(group)})" + (_NOT_BEFORE_ALNUM if right else "")
+            for (left, right), group in sorted(groups.items())
+        ]
+        # A pattern that never matches when there are no keywords
+        self._pattern = re.compile("|".join(alternatives) or r"(?!x)x")
+        self._phrases = any(" " in term for term in self.terms)
+
+    def _normalize(self, text: str) -> str:
+        text = text.lower()
+        return " ".join(text.split()) if self._phrases else text
+
+    def search(self, text: str) -> bool:
+        """Returns True if any keyword occurs in `text`."""
+        return self._pattern.search(self._normalize(text)) is not None
+
+    def matches(self, text: str) -> Set[str]:
+        """
+        Returns the keywords found in `text` (non-overlapping, longest first,
+        so "fee agreed" hides the "agree" inside it).
+        """
+        return {match.group(0) for match in self._pattern.finditer(self._normalize(text))}
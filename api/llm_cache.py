@@ -0,0 +1,88 @@
+import copy
+import hashlib
+import json
+import os
+import time
+from state import load_json, save_json
+
+LLM_CACHE_FILE = "llm_cache.json"
+
+
+class LLMResultCache:
+    """
+    A persistent, content-addressed cache of structured LLM output.
+
+    Entries are keyed by a hash of the normalized article set, the model and
+    the system prompt, so a re-run over the same articles reuses earlier
+    results while any prompt change naturally invalidates them. Entries
+    expire after `ttl_seconds`, and the oldest are evicted once the cache
+    holds more than `max_entries`.
+    """
+    def __init__(self, ttl_seconds=None, max_entries=None):
+        self.ttl_seconds = ttl_seconds or float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+        self.max_entries = max_entries or int(os.getenv("LLM_CACHE_MAX_ENTRIES", "500"))
+        self.entries = load_json(LLM_CACHE_FILE, {})
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+
+    @staticmethod
+    def make_key(articles, model, system_prompt):
+        """Builds the cache key for a set of articles sent to a model."""
+        normalized = sorted(
+            (
+                {
+                    "url": article.get("url"),
+                    "headline": " ".join((article.get("headline") or "").split()),
+                    "content": " ".join((article.get("content") or "").split()),
+                    "source_name": article.get("source_name"),
+                    "image_url": article.get("image_url"),
+                    "related_sources": article.get("related_sources")
+                }
+                for article in articles
+            ),
+            key=lambda article: article["url"] or ""
+        )
+        payload = json.dumps(
+            {"articles": normalized, "model": model, "prompt": system_prompt},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns a copy of the cached stories for `key`, or None on a miss."""
+        entry = self.entries.get(key)
+        if entry is None or time.time() - entry["stored_at"] > self.ttl_seconds:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return copy.deepcopy(entry["stories"])
+
+    def put(self, key, model, stories):
+        """Stores the stories a model returned for an article set."""
+        self.entries[key] = {
+            "stored_at": time.time(),
+            "model": model,
+            "stories": copy.deepcopy(stories)
+        }
+        self._dirty = True
+
+    def _evict(self):
+        """Drops expired entries, then the oldest ones beyond `max_entries`."""
+        now = time.time()
+        self.entries = {
+            key: entry for key, entry in self.entries.items()
+            if now - entry["stored_at"] <= self.ttl_seconds
+        }
+        if len(self.entries) > self.max_entries:
+            newest = sorted(self.entries.items(), key=lambda item: item[1]["stored_at"], reverse=True)
+            self.entries = dict(newest[:self.max_entries])
+
+    def save(self):
+        """Persists the cache if anything was added during this run."""
+        if not self._dirty:
+            return
+        self._evict()
+        save_json(LLM_CACHE_FILE, self.entries)
+        self._dirty = False
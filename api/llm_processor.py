@@ -1,6 +1,12 @@
+import asyncio
+import os
+import time
 import httpx
 import json
 from datetime import datetime, timezone
+import metrics
+from llm_cache import LLMResultCache
+from player_index import normalize_player_name
 
 # The prompt for the LLM
 SYSTEM_PROMPT = """
@@ -10,7 +16,7 @@ You will be given a list of articles that are all related to Arsenal. Your PRIMA
 Your tasks are to:
 1.  **Filter for Transfers**: First, EXAMINE all provided articles. DISCARD ANY article that is NOT STRICTLY about a player transfer or a major contract negotiation. General news, match results, or opinion pieces MUST be discarded. If no articles are about transfers, you MUST return an empty JSON array `[]`.
 
-2.  **Group by Story**: After filtering, group the remaining transfer-only articles by the specific story they refer to (e.g., all articles about Arsenal's interest in a single player).
+2.  **Group by Story**: After filtering, group the remaining transfer-only articles by the specific story they refer to (e.g., all articles about Arsenal's interest in a single player). Some articles have already been grouped with their near-duplicates: their `related_sources` list the source name, URL and headline of the other articles reporting the same story, and count as part of that group.
 
 3.  **Synthesize and Summarize**: For each story group, you MUST write a single, comprehensive summary of ~150 words. This summary should **synthesize the key information from ALL articles in the group** to provide the most complete picture. Do not rely on just one source.
 
@@ -32,76 +38,381 @@ LLM_MODELS = [
     "google/gemma-3-27b-it:free",
 ]
 
-async def process_with_llm(articles, api_key):
+# Chat completions endpoint; overridable to point the pipeline at a replay stub
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+# Chunking settings: each request carries at most this many (estimated)
+# article tokens, and at most this many requests are in flight at once.
+CHUNK_TOKEN_BUDGET = int(os.getenv("LLM_CHUNK_TOKEN_BUDGET", "6000"))
+MAX_CONCURRENT_CHUNKS = int(os.getenv("LLM_MAX_CONCURRENCY", "3"))
+REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+
+# How to use the model list: "sequential" tries one model at a time, while
+# "hedged" starts HEDGE_PARALLEL models at once and adds the next one every
+# HEDGE_DELAY seconds until one of them answers.
+MODEL_STRATEGY = os.getenv("LLM_MODEL_STRATEGY", "sequential")
+HEDGE_PARALLEL = max(1, int(os.getenv("LLM_HEDGE_PARALLEL", "1")))
+HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "20"))
+# OpenRouter statuses that concern the account (API key, credits) rather than
+# one model; after these no other model is tried, whatever the strategy
+ACCOUNT_ERROR_STATUSES = {401, 402, 403}
+
+# Per-model win counts and latency for the current process
+MODEL_STATS = {}
+
+# Sources the editor prompt prefers as the primary URL of a story
+PREFERRED_SOURCES = ["bbc", "sky sports"]
+
+
+def estimate_tokens(article):
+    """Roughly estimates the prompt tokens of an article (~4 characters per token)."""
+    return len(json.dumps(article)) // 4 + 1
+
+
+def chunk_articles(articles, token_budget=CHUNK_TOKEN_BUDGET):
+    """
+    Splits articles into chunks whose estimated size fits the token budget.
+    An article larger than the budget gets a chunk of its own.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for article in articles:
+        tokens = estimate_tokens(article)
+        if current and current_tokens + tokens > token_budget:
+            chunks.append(current)
+            current = []
+            current_tokens = 0
+        current.append(article)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _parse_llm_content(content):
+    """Strips markdown fences from an LLM reply and parses the JSON array."""
+    content = content.strip()
+    if content.startswith("```json"):
+        content = content[7:].strip()
+    if content.endswith("```"):
+        content = content[:-3].strip()
+    stories = json.loads(content)
+    if not _is_story_list(stories):
+        raise ValueError("LLM response is not a JSON array of objects")
+    return stories
+
+
+def _is_story_list(stories):
+    """True if `stories` is a list of story objects (dicts), as the prompt asks for."""
+    return isinstance(stories, list) and all(isinstance(story, dict) for story in stories)
+
+
+def _source_rank(story):
+    """Lower is better: established outlets first, then everything else."""
+    source = (story.get("source_name") or "").lower()
+    for rank, preferred in enumerate(PREFERRED_SOURCES):
+        if preferred in source:
+            return rank
+    return len(PREFERRED_SOURCES)
+
+
+class StoryMerger:
+    """
+    Merges stories produced by different chunks that refer to the same player.
+    The story from the most credible source is kept, and a missing image is
+    filled in from the others. This also keeps player_name unique, which the
+    `player_name` upsert requires.
+
+    With a PlayerNameIndex, player names are first replaced by their
+    canonical form, so "Odegaard" and "Martin Ødegaard" count as one player.
+    """
+    def __init__(self, player_index=None):
+        self.player_index = player_index
+        self.merged = {}
+
+    def _key(self, story):
+        player_name = story.get("player_name")
+        if player_name and self.player_index is not None:
+            story["player_name"] = self.player_index.canonicalize(player_name)
+            return story["player_name"]
+        return normalize_player_name(player_name) if player_name else id(story)
+
+    def add(self, stories):
+        """Merges in a batch of stories and returns the merged stories it created or changed."""
+        changed = {}
+        for story in stories:
+            key = self._key(story)
+            existing = self.merged.get(key)
+            if existing is None:
+                self.merged[key] = changed[key] = story
+                continue
+            primary, other = (story, existing) if _source_rank(story) < _source_rank(existing) else (existing, story)
+            if not primary.get("image_url") and other.get("image_url"):
+                primary["image_url"] = other["image_url"]
+            elif primary is existing:
+                continue
+            self.merged[key] = changed[key] = primary
+        return list(changed.values())
+
+    def stories(self):
+        """Returns every merged story so far."""
+        return list(self.merged.values())
+
+
+class LLMCallError(Exception):
+    """Raised when a model returns no usable output for a chunk."""
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        # False for errors every model would hit too (a rejected API key or no
+        # credits), so no other model is tried; anything else is worth another model
+        self.retryable = retryable
+
+
+async def _call_model(client, model, chunk, api_key):
+    """
+    Sends one chunk of articles to a single OpenRouter model.
+
+    Returns:
+        The parsed list of stories.
+
+    Raises:
+        LLMCallError: If the model is rate-limited, fails or returns bad output.
+    """
+    llm_response_content = ""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        response = await client.post(
+            url=OPENROUTER_URL,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": model, # Use the model from the list
+                "messages": [
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": json.dumps(chunk)}
+                ]
+            },
+            timeout=REQUEST_TIMEOUT
+        )
+        response.raise_for_status()
+
+        # Extract and parse the JSON content from the LLM's response
+        llm_response_content = response.json()['choices'][0]['message']['content']
+        return _parse_llm_content(llm_response_content)
+
+    except httpx.HTTPStatusError as e:
+        outcome = f"http_{e.response.status_code}"
+        if e.response.status_code == 429:
+            print(f"Model {model} is rate-limited.")
+            raise LLMCallError(f"{model} rate-limited") from e
+        print(f"LLM API Error: {e.response.status_code} - {e.response.text}")
+        raise LLMCallError(
+            f"{model} returned {e.response.status_code}",
+            retryable=e.response.status_code not in ACCOUNT_ERROR_STATUSES
+        ) from e
+    except (json.JSONDecodeError, KeyError, ValueError) as e:
+        outcome = "bad_output"
+        print(f"Failed to parse LLM response from {model}: {e}")
+        print(f"Raw response was: {llm_response_content}")
+        raise LLMCallError(f"{model} returned unparseable output") from e
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    except Exception as e:
+        outcome = "error"
+        print(f"An unexpected error occurred during LLM processing with {model}: {e}")
+        raise LLMCallError(f"{model} failed: {e}") from e
+    finally:
+        metrics.observe("llm_request_seconds", time.perf_counter() - start, model=model)
+        metrics.increment("llm_requests", model=model, outcome=outcome)
+
+
+def _record_win(model, elapsed):
+    """Records which model answered a chunk and how long it took."""
+    stats = MODEL_STATS.setdefault(model, {"wins": 0, "total_seconds": 0.0})
+    stats["wins"] += 1
+    stats["total_seconds"] += elapsed
+    print(f"Successfully processed with {model} in {elapsed:.1f}s.")
+
+
+async def _sequential_models(client, chunk, api_key):
+    """
+    Tries the models one at a time, moving on after any failure except a
+    non-retryable one (see LLMCallError), which ends the chunk.
+    """
+    for model in LLM_MODELS:
+        print(f"Attempting to process {len(chunk)} articles with model: {model}...")
+        start = time.perf_counter()
+        try:
+            stories = await _call_model(client, model, chunk, api_key)
+        except LLMCallError as e:
+            if e.retryable:
+                continue # Go to the next model
+            return None, None
+        _record_win(model, time.perf_counter() - start)
+        return model, stories
+    return None, None
+
+
+async def _hedged_models(client, chunk, api_key):
+    """
+    Races the models: the top HEDGE_PARALLEL start at once, and another one is
+    started every HEDGE_DELAY seconds without an answer (or straight away when
+    a model fails). The first valid response wins and the rest are cancelled.
+    As with `_sequential_models`, a non-retryable failure ends the chunk.
+    """
+    start = time.perf_counter()
+    remaining = iter(LLM_MODELS)
+    tasks = {}
+
+    def launch_next():
+        model = next(remaining, None)
+        if model is not None:
+            print(f"Attempting to process {len(chunk)} articles with model: {model}...")
+            tasks[asyncio.create_task(_call_model(client, model, chunk, api_key))] = model
+
+    for _ in range(HEDGE_PARALLEL):
+        launch_next()
+
+    try:
+        while tasks:
+            done, _ = await asyncio.wait(tasks, timeout=HEDGE_DELAY, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                launch_next()
+                continue
+            for task in done:
+                model = tasks.pop(task)
+                error = task.exception()
+                if error is None:
+                    _record_win(model, time.perf_counter() - start)
+                    return model, task.result()
+                if isinstance(error, LLMCallError) and not error.retryable:
+                    return None, None
+                launch_next()
+        return None, None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _process_chunk(client, chunk, api_key, semaphore, cache):
+    """
+    Processes one chunk of articles, either trying the models in order or
+    racing them (LLM_MODEL_STRATEGY=hedged). A chunk that any model has
+    already answered is served from the cache without a request.
+
+    Returns:
+        The list of stories for this chunk, or None if every model failed.
+    """
+    keys = {model: LLMResultCache.make_key(chunk, model, SYSTEM_PROMPT) for model in LLM_MODELS}
+    for model, key in keys.items():
+        cached = cache.get(key)
+        # Replies cached before they were validated may not be story lists
+        if cached is not None and _is_story_list(cached):
+            print(f"Using cached {model} result for {len(chunk)} articles.")
+            metrics.increment("llm_chunks", result="cached")
+            return cached
+
+    async with semaphore:
+        if MODEL_STRATEGY == "hedged":
+            model, stories = await _hedged_models(client, chunk, api_key)
+        else:
+            model, stories = await _sequential_models(client, chunk, api_key)
+
+    if model is None:
+        print("All LLM models were rate-limited or failed for this chunk.")
+        metrics.increment("llm_chunks", result="failed")
+        return None
+    metrics.increment("llm_chunks", result="processed")
+    cache.put(keys[model], model, stories)
+    return stories
+
+
+async def stream_with_llm(chunk_queue, api_key, classifier=None):
+    """
+    Processes chunks of articles with an LLM as they are put on `chunk_queue`
+    (a None marks the end), yielding each chunk's stories as soon as that
+    chunk is answered. Up to MAX_CONCURRENT_CHUNKS chunks are in flight at
+    once, each trying or racing the model list (see MODEL_STRATEGY), and
+    chunk results are cached on disk, so re-runs over the same articles are
+    free. A chunk every model failed on yields None, so callers can tell
+    that some articles were never processed.
+
+    With a RelevanceClassifier, each answered chunk is recorded as training
+    data for it.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHUNKS)
+    cache = LLMResultCache()
+    chunk_count = 0
+
+    async def run(chunk):
+        return chunk, await _process_chunk(client, chunk, api_key, semaphore, cache)
+
+    # Use an async HTTP client for performance
+    async with httpx.AsyncClient() as client:
+        next_chunk = asyncio.create_task(chunk_queue.get())
+        running = set()
+        try:
+            while next_chunk is not None or running:
+                waiting = running | {next_chunk} if next_chunk is not None else running
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task is next_chunk:
+                        chunk = task.result()
+                        if chunk is None:
+                            next_chunk = None
+                            continue
+                        chunk_count += 1
+                        running.add(asyncio.create_task(run(chunk)))
+                        next_chunk = asyncio.create_task(chunk_queue.get())
+                        continue
+                    running.discard(task)
+                    chunk, stories = task.result()
+                    if stories is None:
+                        yield None
+                        continue
+                    if classifier is not None:
+                        classifier.record(chunk, stories)
+                    # Add a timestamp to each article
+                    current_time = datetime.now(timezone.utc).isoformat()
+                    for story in stories:
+                        story['published_at'] = current_time
+                    yield stories
+        finally:
+            for task in running | ({next_chunk} if next_chunk is not None else set()):
+                task.cancel()
+            # Save even if some chunks failed, so a re-run only pays for those
+            cache.save()
+            print(f"LLM cache: {cache.hits} hits, {chunk_count - cache.hits} chunks sent.")
+            for model, stats in MODEL_STATS.items():
+                print(f"{model}: won {stats['wins']} chunks, avg {stats['total_seconds'] / stats['wins']:.1f}s")
+
+
+async def process_with_llm(articles, api_key, player_index=None, classifier=None):
     """
     Processes scraped articles with an LLM via OpenRouter to filter, deduplicate,
     and summarize, returning clean data ready for the database.
-    It will try a list of models in order if one is rate-limited.
+
+    Articles are split into token-budgeted chunks that are processed
+    concurrently (see `stream_with_llm`), and the resulting stories are
+    merged across chunks by player (canonical names from `player_index`,
+    when given).
     """
     if not articles:
         return []
 
-    processed_articles = []
-    # Use an async HTTP client for performance
-    async with httpx.AsyncClient() as client:
-        for model in LLM_MODELS:
-            print(f"Attempting to process with model: {model}...")
-            try:
-                response = await client.post(
-                    url="https://openrouter.ai/api/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": model, # Use the model from the list
-                        "messages": [
-                            {"role": "system", "content": SYSTEM_PROMPT},
-                            {"role": "user", "content": json.dumps(articles)}
-                        ]
-                    },
-                    timeout=180  # 3-minute timeout
-                )
-                response.raise_for_status()
-                
-                # If we get here, the request was successful
-                print(f"Successfully processed with {model}.")
-                
-                # Extract the JSON content from the LLM's response
-                llm_response_content = response.json()['choices'][0]['message']['content'].strip()
-                
-                # Clean the response: remove markdown fences if they exist
-                if llm_response_content.startswith("```json"):
-                    llm_response_content = llm_response_content[7:].strip()
-                if llm_response_content.endswith("```"):
-                    llm_response_content = llm_response_content[:-3].strip()
-
-                # The LLM should return a JSON string, so we parse it
-                processed_articles = json.loads(llm_response_content)
-
-                # Add a timestamp to each article
-                current_time = datetime.now(timezone.utc).isoformat()
-                for article in processed_articles:
-                    article['published_at'] = current_time
-
-                return processed_articles # Success, exit the function
-
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code == 429:
-                    print(f"Model {model} is rate-limited. Trying next model...")
-                    continue # Go to the next iteration of the loop
-                else:
-                    # For other HTTP errors, print and fail
-                    print(f"LLM API Error: {e.response.status_code} - {e.response.text}")
-                    return [] 
-            except (json.JSONDecodeError, KeyError) as e:
-                print(f"Failed to parse LLM response from {model}: {e}")
-                print(f"Raw response was: {llm_response_content}")
-                continue # Try the next model, as this one might be giving bad output
-            except Exception as e:
-                print(f"An unexpected error occurred during LLM processing with {model}: {e}")
-                return [] # Fail on unexpected errors
-        
-        # If the loop completes without a successful call
-        print("All LLM models were rate-limited or failed. No articles processed.")
-        return [] 
\ No newline at end of file
+    chunks = chunk_articles(articles)
+    print(f"Split {len(articles)} articles into {len(chunks)} LLM chunks.")
+    chunk_queue = asyncio.Queue()
+    for chunk in chunks + [None]:
+        chunk_queue.put_nowait(chunk)
+
+    merger = StoryMerger(player_index)
+    async for stories in stream_with_llm(chunk_queue, api_key, classifier):
+        if stories is not None:
+            merger.add(stories)
+    return merger.stories()
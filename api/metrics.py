@@ -0,0 +1,141 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+# Histogram bucket upper bounds, in seconds (Prometheus' defaults)
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0]
+
+# Process-wide registry for the current run
+_started_at = datetime.now(timezone.utc)
+_spans: List[Dict] = []
+_counters: Dict[Tuple, float] = {}
+_histograms: Dict[Tuple, Dict] = {}
+
+
+def _key(name: str, labels: Dict[str, str]) -> Tuple:
+    return (name,) + tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def increment(name: str, value: float = 1, **labels):
+    """Adds `value` to a counter, e.g. increment("llm_requests", model=m, outcome="ok")."""
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels):
+    """Records one observation (usually seconds) in a histogram."""
+    key = _key(name, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = {"count": 0, "sum": 0.0, "min": value, "max": value, "buckets": [0] * len(BUCKETS)}
+        _histograms[key] = histogram
+    histogram["count"] += 1
+    histogram["sum"] += value
+    histogram["min"] = min(histogram["min"], value)
+    histogram["max"] = max(histogram["max"], value)
+    for i, bound in enumerate(BUCKETS):
+        if value <= bound:
+            histogram["buckets"][i] += 1
+
+
+@contextmanager
+def span(name: str, **labels):
+    """
+    Times a block of (sync or async) code. The span is kept for the run
+    report and its duration is added to the `<name>_seconds` histogram.
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _spans.append({"name": name, "labels": labels, "seconds": round(elapsed, 4), "status": status})
+        observe(f"{name}_seconds", elapsed, **labels)
+
+
+def _labels(key: Tuple) -> Dict[str, str]:
+    return dict(key[1:])
+
+
+def report() -> Dict:
+    """Returns the run's spans, counters and histograms as a JSON-ready dict."""
+    return {
+        "started_at": _started_at.isoformat(),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "spans": _spans,
+        "counters": [
+            {"name": key[0], "labels": _labels(key), "value": value} for key, value in _counters.items()
+        ],
+        "histograms": [
+            {"name": key[0], "labels": _labels(key), "count": h["count"], "sum": round(h["sum"], 4),
+             "min": round(h["min"], 4), "max": round(h["max"], 4)}
+            for key, h in _histograms.items()
+        ]
+    }
+
+
+def _prometheus_labels(labels: Dict[str, str], extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels.items()]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def prometheus_text() -> str:
+    """Renders counters and histograms in the Prometheus text exposition format."""
+    lines = []
+    for name in sorted({key[0] for key in _counters}):
+        metric = f"allforgooners_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for key, value in _counters.items():
+            if key[0] == name:
+                lines.append(f"{metric}{_prometheus_labels(_labels(key))} {value}")
+    for name in sorted({key[0] for key in _histograms}):
+        metric = f"allforgooners_{name}"
+        lines.append(f"# TYPE {metric} histogram")
+        for key, h in _histograms.items():
+            if key[0] != name:
+                continue
+            labels = _labels(key)
+            for bound, count in zip(BUCKETS, h["buckets"]):
+                bucket_labels = _prometheus_labels(labels, 'le="%s"' % bound)
+                lines.append(f"{metric}_bucket{bucket_labels} {count}")
+            bucket_labels = _prometheus_labels(labels, 'le="+Inf"')
+            lines.append(f"{metric}_bucket{bucket_labels} {h['count']}")
+            lines.append(f"{metric}_sum{_prometheus_labels(labels)} {h['sum']}")
+            lines.append(f"{metric}_count{_prometheus_labels(labels)} {h['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def export():
+    """
+    Writes the JSON run report to METRICS_REPORT_PATH (default
+    run_report.json) and, if METRICS_PROMETHEUS_PATH is set, a Prometheus
+    textfile as well.
+    """
+    report_path = os.getenv("METRICS_REPORT_PATH", "run_report.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report(), f, indent=2)
+    print(f"Run report written to {report_path}")
+
+    prometheus_path = os.getenv("METRICS_PROMETHEUS_PATH")
+    if prometheus_path:
+        with open(prometheus_path, 'w', encoding='utf-8') as f:
+            f.write(prometheus_text())
+        print(f"Prometheus metrics written to {prometheus_path}")
+
+
+def reset():
+    """Clears all recorded metrics (e.g. between benchmark runs)."""
+    global _started_at
+    _started_at = datetime.now(timezone.utc)
+    _spans.clear()
+    _counters.clear()
+    _histograms.clear()
@@ -0,0 +1,135 @@
+import os
+import re
+import zlib
+from typing import Dict, List, Set
+from player_index import fold_to_ascii
+
+# MinHash signature length, split into LSH bands of SIGNATURE_SIZE // LSH_BANDS
+# rows. Two articles become candidates if any band matches exactly, which
+# happens with high probability once their Jaccard similarity is above
+# roughly (1 / bands) ** (1 / rows), here 0.25; candidates are then checked
+# against the exact similarity.
+SIGNATURE_SIZE = 32
+LSH_BANDS = 16
+# Only the start of long articles is compared; it carries the story
+MAX_TEXT_CHARS = 1500
+
+_MASK = (1 << 32) - 1
+# Fixed (a, b) pairs for the hash permutations h -> (a * h + b) mod 2**32 (a
+# is odd, so each is a bijection on 32-bit hashes), so clusters, and the LLM
+# chunks built from them, are stable across runs
+_PERMUTATIONS = [
+    (zlib.crc32(f"a{i}".encode()) | 1, zlib.crc32(f"b{i}".encode()))
+    for i in range(SIGNATURE_SIZE)
+]
+_WORD = re.compile(r"[a-z0-9]+")
+# Words too common in football news to say anything about the story
+STOPWORDS = frozenset("""
+    the and for with from that this have has had are was were will would could
+    been after over into about their they his her its not but who what when
+    says said say report reports according more than just also new
+""".split())
+
+
+def _shingles(article) -> Set[int]:
+    """
+    Hashed content words of the article's headline and (start of) content.
+    Outlets paraphrase each other, so single words, rather than word
+    n-grams, are what the same story has in common.
+    """
+    text = f"{article.get('headline') or ''} {(article.get('content') or '')[:MAX_TEXT_CHARS]}".lower()
+    if not text.isascii():
+        text = fold_to_ascii(text)
+    return {
+        zlib.crc32(word.encode())
+        for word in _WORD.findall(text)
+        if len(word) > 2 and word not in STOPWORDS
+    }
+
+
+def _signature(shingles: Set[int]) -> List[int]:
+    return [min((a * h + b) & _MASK for h in shingles) for a, b in _PERMUTATIONS]
+
+
+def _find(parents: List[int], i: int) -> int:
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+
+def cluster_articles(articles, min_similarity=None) -> List[List[Dict]]:
+    """
+    Groups near-duplicate articles with MinHash and LSH banding.
+
+    Articles whose content-word Jaccard similarity is at least
+    `min_similarity` (CLUSTER_MIN_SIMILARITY, default 0.7) end up in the
+    same group, transitively. Groups keep the order in which their first
+    article appeared.
+    """
+    if min_similarity is None:
+        min_similarity = float(os.getenv("CLUSTER_MIN_SIMILARITY", "0.7"))
+    shingles = [_shingles(article) for article in articles]
+    parents = list(range(len(articles)))
+    rows = SIGNATURE_SIZE // LSH_BANDS
+
+    buckets: Dict[tuple, List[int]] = {}
+    for i, article_shingles in enumerate(shingles):
+        if not article_shingles:
+            continue
+        signature = _signature(article_shingles)
+        for band in range(LSH_BANDS):
+            key = (band, *signature[band * rows:(band + 1) * rows])
+            buckets.setdefault(key, []).append(i)
+
+    for members in buckets.values():
+        # Compare each member with one article per group already in the bucket
+        seen: List[int] = []
+        for j in members:
+            for i in seen:
+                root_i, root_j = _find(parents, i), _find(parents, j)
+                if root_i == root_j:
+                    break
+                if len(shingles[i] & shingles[j]) / len(shingles[i] | shingles[j]) >= min_similarity:
+                    parents[root_j] = root_i
+                    break
+            else:
+                seen.append(j)
+
+    groups: Dict[int, List[Dict]] = {}
+    for i, article in enumerate(articles):
+        groups.setdefault(_find(parents, i), []).append(article)
+    return list(groups.values())
+
+
+def collapse_near_duplicates(articles, min_similarity=None) -> List[Dict]:
+    """
+    Replaces each group of near-duplicates with a single article: the one
+    with the most content, plus a `related_sources` list with the source
+    name, URL and headline of every other member (and an image borrowed
+    from them if it has none). Only the other members' content is dropped,
+    so a wrongly merged story still shows up in its headline. Articles
+    without duplicates are returned unchanged.
+    """
+    collapsed = []
+    for group in cluster_articles(articles, min_similarity):
+        if len(group) == 1:
+            collapsed.append(group[0])
+            continue
+        primary = max(group, key=lambda article: len(article.get("content") or ""))
+        representative = dict(primary)
+        others = [article for article in group if article is not primary]
+        # Members may already be collapsed groups themselves
+        related = list(primary.get("related_sources") or [])
+        for article in others:
+            related.append(
+                {"source_name": article.get("source_name"), "url": article.get("url"), "headline": article.get("headline")}
+            )
+            related.extend(article.get("related_sources") or [])
+        representative["related_sources"] = related
+        if not representative.get("image_url"):
+            representative["image_url"] = next(
+                (article["image_url"] for article in others if article.get("image_url")), None
+            )
+        collapsed.append(representative)
+    return collapsed
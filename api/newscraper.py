@@ -1,29 +1,54 @@
 import asyncio
 import os
-import re
+import time
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from twikit import Client
 import feedparser
-from bs4 import BeautifulSoup, Tag
+import metrics
+from feed_fetcher import ConditionalFeedFetcher
+from source_cursors import SourceCursorStore
+from keyword_matcher import KeywordMatcher
+from rss_images import extract_rss_image
+
+# Compiled once; see KeywordMatcher for how words are matched
+ARSENAL_TERMS = KeywordMatcher(['arsenal'], prefix=True)
+ARSENAL_TWEET_TERMS = KeywordMatcher(['arsenal', '#afc'], prefix=True)
 
 class NewsScraper:
     """
     Scrapes Arsenal news from various sources, including Twitter and RSS feeds.
     """
-    def __init__(self):
+    def __init__(self, max_concurrency=None, source_timeout=None):
         self.journalists = ["FabrizioRomano", "David_Ornstein"]
         self.rss_feeds = {
             "BBC Sport": "http://feeds.bbci.co.uk/sport/football/rss.xml",
             "Sky Sports": "https://www.skysports.com/rss/11095"
         }
         self.client = Client('en-US')
+        self.feed_fetcher = ConditionalFeedFetcher(
+            user_agent="AllForGooners/1.0 (RSSScraper; +https://all-for-gooners.vercel.app/)"
+        )
+        self.cursors = SourceCursorStore()
+        # Without a cursor we scan back through a full 7-day window; with one
+        # we page through small batches until we reach the saved mark.
+        self.initial_tweet_count = 250
+        self.incremental_tweet_count = 40
+        self.max_tweet_pages = 5
         # This list is essential for the RSS scraper to find general transfer news
         self.transfer_keywords = [
             'transfer', 'signing', 'signed', 'deal', 'bid', 'contract', 
             'talks', 'move', 'rumour', 'loan', 'join', 'fee agreed', 'here we go',
             '$', '€', '£', 'agree', 'sign'
         ]
+        # Keywords match at word starts, so "sign" also finds "signs" but not "design"
+        self.transfer_matcher = KeywordMatcher(self.transfer_keywords, prefix=True)
+        # Fetch stage settings: how many sources run at once and how long any
+        # single source may take before it is abandoned for this run.
+        self.max_concurrency = max_concurrency or int(os.getenv("SCRAPER_MAX_CONCURRENCY", "8"))
+        self.source_timeout = source_timeout or float(os.getenv("SCRAPER_SOURCE_TIMEOUT", "60"))
+        # Populated by scrape_all: {source: {"seconds": float, "articles": int, "status": str}}
+        self.source_timings = {}
 
     async def _login(self):
         """Logs into Twitter using credentials from environment variables."""
@@ -83,44 +108,66 @@ class NewsScraper:
         if tweet.reply_to:
             return False
             
-        content_lower = (tweet.full_text).lower()
-        is_arsenal_related = 'arsenal' in content_lower or '#afc' in content_lower
-        
-        # Check for transfer keywords to improve relevance
-        transfer_keywords = ['transfer', 'sign', 'deal', 'bid', 'contract', 'talks', 'move']
-        has_transfer_keyword = any(keyword in content_lower for keyword in transfer_keywords)
-        
-        # For testing purposes, be more lenient to get more results
-        return is_arsenal_related  # Removed the AND condition to get more results
+        # For testing purposes, be more lenient to get more results: any
+        # Arsenal mention, without also requiring a transfer keyword
+        return ARSENAL_TWEET_TERMS.search(tweet.full_text)
 
     async def _scrape_twitter_user(self, username):
-        """Fetches and processes recent tweets for a single user."""
+        """
+        Fetches and processes tweets for a single user that are newer than the
+        user's saved cursor (or from the last 7 days on the first run).
+        """
         print(f"Scraping tweets for {username}...")
         articles = []
+        source = f"twitter:{username}"
+        last_seen_id = self.cursors.get(source)
         # Look back 7 days to have a better chance of finding relevant test tweets
         seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
+        newest_id = None
+        # Only a scan that got back to the old mark (or the end of the
+        # window) without errors may move the mark; otherwise the tweets we
+        # did not read would fall below it and never be fetched again.
+        complete = False
         try:
             user = await self.client.get_user_by_screen_name(username)
-            # Fetch more tweets to ensure we see the history of very active users
-            tweets = await user.get_tweets('Tweets', count=250) 
-            
-            for tweet in tweets:
-                # Stop if tweets are older than the time window
-                if tweet.created_at_datetime < seven_days_ago:
-                    break
+            count = self.incremental_tweet_count if last_seen_id else self.initial_tweet_count
+            tweets = await user.get_tweets('Tweets', count=count)
 
-                if self._is_relevant_tweet(tweet):
-                    image_url = self._get_image_from_tweet(tweet)
-                    articles.append({
-                        "headline": tweet.full_text,
-                        "source_name": user.name,
-                        "url": f"https://x.com/{user.screen_name}/status/{tweet.id}",
-                        "content": tweet.full_text,
-                        "image_url": image_url
-                    })
+            reached_known = False
+            for page in range(self.max_tweet_pages):
+                for tweet in tweets:
+                    tweet_id = int(tweet.id)
+                    # Stop once we reach tweets handled by an earlier run
+                    if last_seen_id and tweet_id <= last_seen_id:
+                        reached_known = True
+                        break
+                    # Stop if tweets are older than the time window
+                    if tweet.created_at_datetime < seven_days_ago:
+                        reached_known = True
+                        break
+                    newest_id = max(newest_id or 0, tweet_id)
+
+                    if self._is_relevant_tweet(tweet):
+                        image_url = self._get_image_from_tweet(tweet)
+                        articles.append({
+                            "headline": tweet.full_text,
+                            "source_name": user.name,
+                            "url": f"https://x.com/{user.screen_name}/status/{tweet.id}",
+                            "content": tweet.full_text,
+                            "image_url": image_url
+                        })
+                # The first run already fetched the whole window in one page
+                if reached_known or not last_seen_id or len(tweets) == 0:
+                    complete = True
+                    break
+                tweets = await tweets.next()
         except Exception as e:
             print(f"Error scraping user {username}: {e}")
-        
+
+        if newest_id and complete:
+            self.cursors.advance(source, newest_id)
+        elif newest_id:
+            print(f"Keeping the cursor for {username}: the scan did not reach the last seen tweet.")
         print(f"Found {len(articles)} potential rumors from {username}.")
         return articles
 
@@ -128,98 +175,37 @@ class NewsScraper:
 
     def _get_image_from_rss_entry(self, entry):
         """Attempts to find an image URL from various places in an RSS entry."""
-        image_url = None
-        
-        # Debug the entry structure to see what's available
-        print(f"Examining RSS entry: {entry.title}")
-        
-        # 1. Check for media_content (most reliable)
-        if hasattr(entry, 'media_content') and entry.media_content:
-            print(f"Found media_content in entry: {entry.title}")
-            for media in entry.media_content:
-                if media.get('medium') == 'image' and media.get('url'):
-                    image_url = media.get('url')
-                    print(f"Found image in media_content: {image_url}")
-                    break
-        
-        # 2. Check for enclosures (another common pattern)
-        if not image_url and hasattr(entry, 'enclosures') and entry.enclosures:
-            print(f"Found enclosures in entry: {entry.title}")
-            for enclosure in entry.enclosures:
-                if enclosure.get('type', '').startswith('image/'):
-                    image_url = enclosure.get('href')
-                    print(f"Found image in enclosure: {image_url}")
-                    break
-        
-        # 3. Check for media_thumbnail
-        if not image_url and hasattr(entry, 'media_thumbnail') and entry.media_thumbnail:
-            print(f"Found media_thumbnail in entry: {entry.title}")
-            image_url = entry.media_thumbnail[0].get('url')
-            print(f"Found image in media_thumbnail: {image_url}")
-        
-        # 4. Fallback to parsing the summary HTML
-        if not image_url and hasattr(entry, 'summary'):
-            soup = BeautifulSoup(entry.summary, 'html.parser')
-            img_tag = soup.find('img')
-            if isinstance(img_tag, Tag) and img_tag.get('src'):
-                image_url = img_tag.get('src')
-                print(f"Found image in summary HTML: {image_url}")
-        
-        # 5. Clean up BBC image URLs to get a higher resolution
-        if image_url and isinstance(image_url, str) and 'bbci.co.uk' in image_url:
-            try:
-                # Use a more generic regex to handle different image sizes
-                original_url = image_url
-                image_url = re.sub(r'/cps/\d+/', '/cps/800/', image_url)
-                print(f"Cleaned BBC image URL from {original_url} to {image_url}")
-            except Exception as e:
-                print(f"Error cleaning BBC image URL: {e}")
-        
-        # 6. Handle Sky Sports images to get higher resolution
-        if image_url and isinstance(image_url, str) and 'skysports' in image_url:
-            try:
-                # For Sky Sports, try to get the highest quality version
-                original_url = image_url
-                if 'e=XXXLARGE' not in image_url:
-                    image_url = re.sub(r'e=\w+', 'e=XXXLARGE', image_url)
-                    print(f"Enhanced Sky Sports image URL from {original_url} to {image_url}")
-            except Exception as e:
-                print(f"Error enhancing Sky Sports image URL: {e}")
-        
-        # 7. Verify the image URL is valid
-        if image_url:
-            try:
-                # Make sure the URL starts with http or https
-                if isinstance(image_url, str) and not image_url.startswith(('http://', 'https://')):
-                    if isinstance(image_url, str) and image_url.startswith('//'):
-                        image_url = 'https:' + image_url
-                    else:
-                        image_url = 'https://' + image_url
-                print(f"Final image URL: {image_url}")
-            except Exception as e:
-                print(f"Error validating image URL: {e}")
-        
-        return image_url
+        return extract_rss_image(entry)
 
     def _is_relevant_rss_entry(self, entry):
         """
         Checks if an RSS article is a relevant Arsenal transfer story.
         An article is relevant if it's about Arsenal OR it's a general transfer story.
         """
-        content_lower = (entry.title + " " + entry.summary).lower()
-        is_arsenal_related = 'arsenal' in content_lower
-        has_transfer_keyword = any(keyword in content_lower for keyword in self.transfer_keywords)
+        content = entry.title + " " + entry.summary
+        is_arsenal_related = ARSENAL_TERMS.search(content)
+        has_transfer_keyword = self.transfer_matcher.search(content)
         
         # We let the LLM do the final filtering, so we cast a wider net here.
         return is_arsenal_related or has_transfer_keyword
 
     def _scrape_rss_feed(self, source_name, url):
-        """Parses a single RSS feed and returns a list of relevant articles."""
+        """
+        Parses a single RSS feed.
+
+        Returns:
+            A (relevant articles, feed validators) tuple; the validators are
+            None if the feed could not be read completely.
+        """
         print(f"Scraping {source_name} from {url}...")
         articles = []
+        validators = None
         try:
-            user_agent = "AllForGooners/1.0 (RSSScraper; +https://all-for-gooners.vercel.app/)"
-            feed = feedparser.parse(url, agent=user_agent)
+            body, validators = self.feed_fetcher.fetch(url)
+            if body is None:
+                print(f"No changes in {source_name} since the last run.")
+                return articles, validators
+            feed = feedparser.parse(body)
 
             for entry in feed.entries:
                 if self._is_relevant_rss_entry(entry):
@@ -233,30 +219,104 @@ class NewsScraper:
                     })
         except Exception as e:
             print(f"Error scraping feed {source_name}: {e}")
+            validators = None
         
         print(f"Found {len(articles)} potential rumors from {source_name}.")
+        return articles, validators
+
+    async def _fetch_rss_source(self, source_name, url):
+        """
+        Scrapes a feed in a worker thread (feedparser is blocking). Its
+        validators are only staged here, on the event loop, once the thread
+        has finished in time: if `_run_source` times out, this coroutine is
+        cancelled first, so the articles it threw away are fetched again.
+        """
+        articles, validators = await asyncio.to_thread(self._scrape_rss_feed, source_name, url)
+        self.feed_fetcher.stage(url, validators)
         return articles
 
     # --- Main Scraper Method ---
-    async def scrape_all(self):
-        """Logs in, scrapes all sources (Twitter and RSS), and returns combined articles."""
-        # Scrape Twitter
+    def save_state(self):
+        """
+        Persists per-source state (feed validators and tweet cursors) gathered
+        during this run. Call only after the run's articles have been stored
+        successfully.
+        """
+        self.feed_fetcher.save()
+        self.cursors.save()
+
+    async def _run_source(self, source, fetch, semaphore):
+        """
+        Runs a single source fetch under the shared semaphore and timeout.
+        A source that fails or times out contributes no articles but never
+        blocks or aborts the other sources.
+        """
+        async with semaphore:
+            start = time.perf_counter()
+            status = "ok"
+            articles = []
+            try:
+                articles = await asyncio.wait_for(fetch(), timeout=self.source_timeout)
+            except asyncio.TimeoutError:
+                status = "timeout"
+                print(f"Source {source} timed out after {self.source_timeout:.0f}s, skipping.")
+            except Exception as e:
+                status = "error"
+                print(f"Error fetching source {source}: {e}")
+            elapsed = time.perf_counter() - start
+            metrics.observe("source_fetch_seconds", elapsed, source=source)
+            metrics.increment("source_fetches", source=source, status=status)
+            metrics.increment("source_articles", len(articles), source=source)
+            self.source_timings[source] = {
+                "seconds": round(elapsed, 3),
+                "articles": len(articles),
+                "status": status
+            }
+            return articles
+
+    def _print_source_timings(self):
+        """Prints how long each source took during the last fetch stage."""
+        print("--- Source timings ---")
+        for source, timing in sorted(self.source_timings.items(), key=lambda item: -item[1]["seconds"]):
+            print(f"{source}: {timing['seconds']:.2f}s, {timing['articles']} articles ({timing['status']})")
+
+    async def iter_sources(self):
+        """
+        Logs in, then scrapes all sources (Twitter and RSS) concurrently,
+        yielding each source's articles as soon as that source finishes. Each
+        source runs with its own timeout, bounded by `max_concurrency`
+        sources in flight at once.
+        """
         await self._login()
-        twitter_articles = []
-        for username in self.journalists:
-            articles = await self._scrape_twitter_user(username)
-            twitter_articles.extend(articles)
-        print("Finished scraping Twitter feeds.")
 
-        # Scrape RSS Feeds
-        rss_articles = []
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.source_timings = {}
+        tasks = []
+        for username in self.journalists:
+            tasks.append(self._run_source(
+                f"twitter:{username}",
+                lambda username=username: self._scrape_twitter_user(username),
+                semaphore
+            ))
         for source_name, url in self.rss_feeds.items():
-            # Running in a separate thread to avoid blocking asyncio event loop
-            loop = asyncio.get_running_loop()
-            articles = await loop.run_in_executor(
-                None, self._scrape_rss_feed, source_name, url
-            )
-            rss_articles.extend(articles)
-        print("Finished scraping RSS feeds.")
-        
-        return twitter_articles + rss_articles 
\ No newline at end of file
+            tasks.append(self._run_source(
+                f"rss:{source_name}",
+                lambda source_name=source_name, url=url: self._fetch_rss_source(source_name, url),
+                semaphore
+            ))
+
+        stage_start = time.perf_counter()
+        tasks = [asyncio.create_task(task) for task in tasks]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Only matters if the consumer stops early
+            for task in tasks:
+                task.cancel()
+        print(f"Finished scraping {len(tasks)} sources in {time.perf_counter() - stage_start:.2f}s.")
+        self._print_source_timings()
+
+    async def scrape_all(self):
+        """Scrapes all sources (see `iter_sources`) and returns the combined articles."""
+        return [article async for articles in self.iter_sources() for article in articles]
@@ -0,0 +1,172 @@
+import unicodedata
+from typing import Dict, Iterable, List, Set
+from state import load_json, save_json
+
+PLAYER_NAMES_FILE = "player_names.json"
+
+# Letters that Unicode decomposition does not reduce to plain ASCII
+_EXTRA_FOLDS = str.maketrans({
+    "ø": "o", "Ø": "o", "æ": "ae", "Æ": "ae", "œ": "oe", "Œ": "oe",
+    "ß": "ss", "ł": "l", "Ł": "l", "đ": "d", "Đ": "d", "ı": "i", "þ": "th"
+})
+
+
+def fold_to_ascii(text: str) -> str:
+    """Strips accents (and drops any other non-ASCII character) in one C-level pass."""
+    return unicodedata.normalize("NFKD", text.translate(_EXTRA_FOLDS)).encode("ascii", "ignore").decode("ascii")
+
+
+def normalize_player_name(player_name: str) -> str:
+    """Lowercases, strips accents and punctuation, and collapses whitespace."""
+    folded = unicodedata.normalize("NFKD", player_name.translate(_EXTRA_FOLDS))
+    folded = "".join(ch if ch.isalnum() else " " for ch in folded if not unicodedata.combining(ch))
+    return " ".join(folded.lower().split())
+
+
+def common_name(names: List[str]) -> str:
+    """
+    The name a player is known by, from API-Football's [legal full name,
+    short name] pair: the short name with an initial spelled out from the
+    full name ("W. Saliba" + "William Alain André Gabriel Saliba" ->
+    "William Saliba"), or the short name as is ("Gabriel Jesus").
+    """
+    full_name, short_name = names[0], names[-1]
+    first_names = full_name.split()
+    words = []
+    for word in short_name.split():
+        if len(word) == 2 and word.endswith("."):
+            initial = normalize_player_name(word)
+            word = next((name for name in first_names if normalize_player_name(name).startswith(initial)), word)
+        words.append(word)
+    return " ".join(words) or full_name
+
+
+def _within_typos(a: str, b: str, max_typos: int) -> bool:
+    """True if `a` and `b` are at most `max_typos` edits (Levenshtein) apart."""
+    if abs(len(a) - len(b)) > max_typos:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, ch_a in enumerate(a, 1):
+        current = [i]
+        for j, ch_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ch_a != ch_b)))
+        if min(current) > max_typos:
+            return False
+        previous = current
+    return previous[-1] <= max_typos
+
+
+def _trigrams(name: str) -> Set[str]:
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class PlayerNameIndex:
+    """
+    An in-memory index from raw player mentions to canonical player ids.
+
+    A mention is resolved, in order, by:
+    1. its accent-folded form matching a known alias exactly;
+    2. its tokens being a subset of exactly one player's alias tokens,
+       including the alias's surname ("Saka" -> "Bukayo Saka", "Gabriel
+       Magalhaes" -> "Gabriel dos Santos Magalhães", but "Martin" alone
+       resolves to no one);
+    3. trigram similarity with a known alias, above `min_similarity`, if
+       the surnames are at most a typo or two apart ("Martin Odegard" ->
+       "Martin Ødegaard", but not "Ben Whiteman" -> "Ben White").
+
+    Resolved ids become upsert keys, so a mention that could be someone
+    else is left unresolved rather than guessed.
+
+    Candidates for steps 2 and 3 come from inverted indexes, so a lookup only
+    touches aliases that share a token or trigram with the mention.
+    """
+    def __init__(self, min_similarity: float = 0.6):
+        self.min_similarity = min_similarity
+        self.aliases: Dict[str, List[str]] = {}
+        self._exact: Dict[str, str] = {}
+        self._alias_tokens: Dict[str, Set[str]] = {}
+        self._alias_trigrams: Dict[str, Set[str]] = {}
+        self._by_token: Dict[str, Set[str]] = {}
+        self._by_trigram: Dict[str, Set[str]] = {}
+
+    def add(self, player_id: str, names: Iterable[str]):
+        """Registers one or more names (aliases) for a canonical player id."""
+        aliases = self.aliases.setdefault(player_id, [])
+        for name in names:
+            folded = normalize_player_name(name)
+            if not folded or folded in self._exact:
+                continue
+            aliases.append(name)
+            self._exact[folded] = player_id
+            self._alias_tokens[folded] = set(folded.split())
+            self._alias_trigrams[folded] = _trigrams(folded)
+            for token in self._alias_tokens[folded]:
+                self._by_token.setdefault(token, set()).add(folded)
+            for trigram in self._alias_trigrams[folded]:
+                self._by_trigram.setdefault(trigram, set()).add(folded)
+
+    def resolve(self, mention: str) -> str | None:
+        """
+        Resolves a raw player mention.
+
+        Returns:
+            The canonical player id, or None if the mention matches no one.
+        """
+        folded = normalize_player_name(mention)
+        if not folded:
+            return None
+        if folded in self._exact:
+            return self._exact[folded]
+
+        # Token subset: every token of the mention appears in the alias, and
+        # one of them is the alias's surname
+        tokens = folded.split()
+        candidates = set.intersection(*(self._by_token.get(token, set()) for token in tokens))
+        player_ids = {self._exact[alias] for alias in candidates if alias.split()[-1] in tokens}
+        if len(player_ids) == 1:
+            return player_ids.pop()
+
+        # Trigram similarity (Jaccard) against aliases sharing any trigram
+        mention_trigrams = _trigrams(folded)
+        overlap: Dict[str, int] = {}
+        for trigram in mention_trigrams:
+            for alias in self._by_trigram.get(trigram, ()):
+                overlap[alias] = overlap.get(alias, 0) + 1
+        best_alias, best_score = None, 0.0
+        for alias, shared in overlap.items():
+            score = shared / (len(mention_trigrams) + len(self._alias_trigrams[alias]) - shared)
+            if score > best_score and score >= self.min_similarity and self._same_surname(tokens[-1], alias):
+                best_alias, best_score = alias, score
+        return self._exact[best_alias] if best_alias else None
+
+    @staticmethod
+    def _same_surname(surname: str, alias: str) -> bool:
+        """True if a mention's surname is the alias's surname, give or take a typo (two for long names)."""
+        alias_surname = alias.split()[-1]
+        return _within_typos(surname, alias_surname, 1 if len(alias_surname) < 8 else 2)
+
+    def canonicalize(self, mention: str) -> str:
+        """
+        Returns the canonical id for a mention, registering the mention as a
+        new player (its own canonical id) if it matches no one.
+        """
+        player_id = self.resolve(mention)
+        if player_id is None:
+            player_id = " ".join(mention.split())
+            self.add(player_id, [player_id])
+        elif mention not in self.aliases[player_id]:
+            self.add(player_id, [mention])
+        return player_id
+
+    @classmethod
+    def load(cls) -> "PlayerNameIndex":
+        """Loads the canonical players and aliases saved by earlier runs."""
+        index = cls()
+        for player_id, names in load_json(PLAYER_NAMES_FILE, {}).items():
+            index.add(player_id, names)
+        return index
+
+    def save(self):
+        """Persists canonical players and their aliases for later runs."""
+        save_json(PLAYER_NAMES_FILE, self.aliases)
@@ -0,0 +1,186 @@
+import hashlib
+import math
+import os
+import re
+import time
+from typing import Dict, List, Tuple
+from keyword_matcher import KeywordMatcher
+from player_index import fold_to_ascii, normalize_player_name
+from state import load_json, save_json
+
+RELEVANCE_MODEL_FILE = "relevance_model.json"
+
+# Terms that almost always mean a transfer story, and ones that almost
+# always mean match coverage. Their hits become features of their own, and
+# until the model has been trained they are all it has to go on. Terms are
+# matched against the article's lowercased, accent-folded words.
+TRANSFER_TERMS = {
+    "here_we_go": ["here we go"],
+    "fee": ["fee", "bid", "offer", "release clause", "buy back", "buyback"],
+    "signing": ["sign", "signs", "signed", "signing", "joins", "joined", "unveil", "unveiled", "unveils"],
+    "talks": ["talks", "negotiate", "negotiating", "negotiation", "negotiations", "personal terms",
+              "agreement", "agreed", "verbal"],
+    "medical": ["medical"],
+    "loan": ["loan", "permanent", "option to buy", "obligation to buy"],
+    "contract": ["contract", "extension", "new deal", "renew", "renewal", "renewed"],
+    "window": ["transfer", "window", "target", "interest", "approach", "swoop", "move"],
+}
+MATCH_TERMS = {
+    "match_report": ["match report", "player ratings", "highlights", "as it happened", "live"],
+    "fixture": ["preview", "line up", "lineup", "lineups", "line ups", "team news", "predicted",
+                "kick off", "kickoff"],
+    "press": ["press conference", "post match", "pre match"],
+    "injury": ["injury", "injured", "ruled out", "hamstring"],
+}
+# The two features that need more than word lookups
+_MONEY = re.compile(r"[£€$] ?\d|\b\d+(?:\.\d+)? ?(?:m|million|bn)\b")
+_SCORELINE = re.compile(r"\b\d ?- ?\d\b|\bvs?\.? ")
+
+_PRIOR_WEIGHTS = {f"p:{name}": 1.5 for name in [*TRANSFER_TERMS, "money"]}
+_PRIOR_WEIGHTS.update({f"p:{name}": -1.5 for name in [*MATCH_TERMS, "scoreline"]})
+_PRIOR_WEIGHTS["p:here_we_go"] = 4.0
+
+# Term -> feature, and one matcher for all of them
+_TERMS = {
+    term: f"p:{name}"
+    for name, terms in {**TRANSFER_TERMS, **MATCH_TERMS}.items()
+    for term in terms
+}
+_TERM_MATCHER = KeywordMatcher(_TERMS)
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _words(text: str) -> List[str]:
+    """The lowercased, accent-folded words of a text."""
+    text = text.lower()
+    if not text.isascii():
+        text = fold_to_ascii(text)
+    return _WORD.findall(text)
+
+
+def extract_features(article) -> List[str]:
+    """Returns the sparse binary features of an article: term hits and words."""
+    text = f"{article.get('headline') or ''} {article.get('content') or ''}"
+    words = _words(text)
+    features = {f"w:{word}" for word in words if len(word) > 2}
+    features.update(_TERMS[term] for term in _TERM_MATCHER.matches(" ".join(words)))
+    lowered = text.lower()
+    if _MONEY.search(lowered):
+        features.add("p:money")
+    if _SCORELINE.search(lowered):
+        features.add("p:scoreline")
+    if "x.com/" in (article.get("url") or ""):
+        features.add("src:twitter")
+    return sorted(features)
+
+
+def _sigmoid(z: float) -> float:
+    if z < -30:
+        return 0.0
+    if z > 30:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+class RelevanceClassifier:
+    """
+    A local pre-filter that decides which articles are worth sending to the LLM.
+
+    Each article is scored by a logistic regression over binary features
+    (compiled transfer/match pattern hits plus word tokens). The model is
+    trained in pure Python on the LLM's own past keep/discard decisions,
+    which `record()` collects; until `min_examples` of them exist, only the
+    hand-set pattern weights are used, which lets through anything that
+    is not clearly match coverage. Articles scoring below `threshold` are
+    dropped, except for a small `explore_rate` share that is forwarded
+    anyway so the training data keeps covering what the model rejects.
+    """
+    def __init__(self, threshold=None, explore_rate=None, min_examples=None, max_examples=None):
+        self.threshold = threshold if threshold is not None else float(os.getenv("RELEVANCE_THRESHOLD", "0.2"))
+        self.explore_rate = explore_rate if explore_rate is not None else float(os.getenv("RELEVANCE_EXPLORE_RATE", "0.05"))
+        self.min_examples = min_examples or int(os.getenv("RELEVANCE_MIN_EXAMPLES", "200"))
+        self.max_examples = max_examples or int(os.getenv("RELEVANCE_MAX_EXAMPLES", "3000"))
+        state = load_json(RELEVANCE_MODEL_FILE, {})
+        # Labelled examples by URL: {"features": [...], "label": 0 or 1, "seen_at": float}
+        self.examples: Dict[str, Dict] = state.get("examples", {})
+        self.bias: float = state.get("bias", -1.0)
+        self.weights: Dict[str, float] = state.get("weights") or dict(_PRIOR_WEIGHTS)
+        self._dirty = False
+
+    def score(self, article) -> float:
+        """Returns the estimated probability that the LLM keeps this article."""
+        z = self.bias + sum(self.weights.get(feature, 0.0) for feature in extract_features(article))
+        return _sigmoid(z)
+
+    def _explore(self, article) -> bool:
+        # Deterministic per URL, so re-runs make the same choice
+        digest = hashlib.sha256((article.get("url") or "").encode("utf-8")).digest()
+        return int.from_bytes(digest[:4], "big") / 2**32 < self.explore_rate
+
+    def filter(self, articles) -> Tuple[List[Dict], List[Dict]]:
+        """Splits articles into (forwarded to the LLM, dropped)."""
+        kept, dropped = [], []
+        for article in articles:
+            if self.score(article) >= self.threshold or self._explore(article):
+                kept.append(article)
+            else:
+                dropped.append(article)
+        return kept, dropped
+
+    def record(self, articles, stories):
+        """
+        Labels the articles of one LLM chunk from the stories it returned. An
+        article is a keep if a story uses its URL or it mentions a story's
+        player by surname; everything else in the chunk was discarded.
+        """
+        urls = {story.get("url") for story in stories}
+        surnames = {
+            normalize_player_name(story["player_name"]).split()[-1]
+            for story in stories
+            if story.get("player_name") and normalize_player_name(story["player_name"])
+        }
+        now = time.time()
+        for article in articles:
+            url = article.get("url")
+            if not url:
+                continue
+            words = set(_words(f"{article.get('headline') or ''} {article.get('content') or ''}"))
+            label = 1 if url in urls or surnames & words else 0
+            self.examples[url] = {"features": extract_features(article), "label": label, "seen_at": now}
+        self._dirty = True
+
+    def train(self, epochs=8, learning_rate=0.1, l2=1e-4):
+        """Fits the weights to the recorded examples with plain SGD (no-op below `min_examples`)."""
+        if len(self.examples) < self.min_examples:
+            return
+        examples = sorted(self.examples.items())
+        bias = 0.0
+        weights: Dict[str, float] = {}
+        for epoch in range(epochs):
+            rate = learning_rate / (1 + epoch)
+            for _, example in examples:
+                features = example["features"]
+                error = _sigmoid(bias + sum(weights.get(f, 0.0) for f in features)) - example["label"]
+                bias -= rate * error
+                for feature in features:
+                    weight = weights.get(feature, 0.0)
+                    weights[feature] = weight - rate * (error + l2 * weight)
+        self.bias = bias
+        # Drop near-zero weights to keep the state file small
+        self.weights = {feature: round(w, 4) for feature, w in weights.items() if abs(w) >= 1e-3}
+
+    def _evict(self):
+        """Keeps only the newest `max_examples` examples."""
+        if len(self.examples) > self.max_examples:
+            newest = sorted(self.examples.items(), key=lambda item: item[1]["seen_at"], reverse=True)
+            self.examples = dict(newest[:self.max_examples])
+
+    def save(self):
+        """Retrains on the examples recorded so far and persists model and examples."""
+        if not self._dirty:
+            return
+        self._evict()
+        self.train()
+        save_json(RELEVANCE_MODEL_FILE, {"bias": self.bias, "weights": self.weights, "examples": self.examples})
+        self._dirty = False
+
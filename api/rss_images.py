@@ -0,0 +1,97 @@
+import logging
+import re
+from html.parser import HTMLParser
+from typing import Optional
+
+# selectolax parses HTML in C; without it we scan tags with html.parser
+try:
+    from selectolax.parser import HTMLParser as SelectolaxParser
+    SELECTOLAX_AVAILABLE = True
+except ImportError:
+    SELECTOLAX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Host-specific rewrites to a higher-resolution version of the same image:
+# (substring of the URL, pattern, replacement)
+IMAGE_URL_REWRITES = [
+    # BBC: any rendition width -> 800px
+    ("bbci.co.uk", re.compile(r'/cps/\d+/'), '/cps/800/'),
+    # Sky Sports: any size preset -> the largest one
+    ("skysports", re.compile(r'e=\w+'), 'e=XXXLARGE'),
+]
+
+# A whole <img> tag: up to the first ">" outside quoted attribute values
+_IMG_TAG = re.compile(r'''<img\b(?:[^>"']|"[^"]*"|'[^']*')*>''', re.IGNORECASE)
+
+
+class _ImageTagScanner(HTMLParser):
+    """Collects the src of an <img> tag from html.parser's start-tag events."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.src = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "img" and self.src is None:
+            self.src = next((value for name, value in attrs if name == "src" and value), None)
+
+
+def first_image_src(html: str) -> Optional[str]:
+    """
+    Returns the src of the first <img> in an HTML fragment. Summaries without
+    an <img> are rejected by a single regex search; otherwise only the <img>
+    tags themselves are parsed, never the whole fragment. A tag ends at the
+    first ">" outside quotes, so alt="a>b" does not cut it short.
+    """
+    match = _IMG_TAG.search(html)
+    if match is None:
+        return None
+    if SELECTOLAX_AVAILABLE:
+        node = SelectolaxParser(html).css_first("img[src]")
+        return node.attributes.get("src") if node is not None else None
+    for match in _IMG_TAG.finditer(html, match.start()):
+        scanner = _ImageTagScanner()
+        scanner.feed(match.group(0))
+        if scanner.src:
+            return scanner.src
+    return None
+
+
+def upgrade_image_url(image_url: str) -> str:
+    """Applies the host rewrites and makes the URL absolute (https)."""
+    for host, pattern, replacement in IMAGE_URL_REWRITES:
+        if host in image_url:
+            image_url = pattern.sub(replacement, image_url)
+    if not image_url.startswith(('http://', 'https://')):
+        image_url = ('https:' if image_url.startswith('//') else 'https://') + image_url
+    return image_url
+
+
+def extract_rss_image(entry) -> Optional[str]:
+    """
+    Finds an image URL for a feedparser entry, in order of reliability:
+    media_content, image enclosures, media_thumbnail, then the first <img>
+    in the summary HTML. The result is upgraded with `upgrade_image_url`.
+    """
+    image_url = None
+    source = None
+    for media in entry.get('media_content') or []:
+        if media.get('medium') == 'image' and media.get('url'):
+            image_url, source = media['url'], "media_content"
+            break
+    if not image_url:
+        for enclosure in entry.get('enclosures') or []:
+            if enclosure.get('type', '').startswith('image/') and enclosure.get('href'):
+                image_url, source = enclosure['href'], "enclosure"
+                break
+    if not image_url and entry.get('media_thumbnail'):
+        image_url, source = entry['media_thumbnail'][0].get('url'), "media_thumbnail"
+    if not image_url and entry.get('summary'):
+        image_url, source = first_image_src(entry['summary']), "summary HTML"
+
+    if not image_url or not isinstance(image_url, str):
+        logger.debug("No image in RSS entry: %s", entry.get('title'))
+        return None
+    upgraded = upgrade_image_url(image_url)
+    logger.debug("Image for RSS entry %s from %s: %s -> %s", entry.get('title'), source, image_url, upgraded)
+    return upgraded
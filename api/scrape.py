@@ -1,29 +1,35 @@
 import os
 import json
+import logging
 import asyncio
+import time
 import httpx
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-from supabase import create_client, Client
 from newscraper import NewsScraper
-from llm_processor import process_with_llm
+from llm_processor import CHUNK_TOKEN_BUDGET, StoryMerger, chunk_articles, estimate_tokens, stream_with_llm
+from relevance_classifier import RelevanceClassifier
+from near_duplicates import collapse_near_duplicates
+from keyword_matcher import KeywordMatcher
 from sports_api_client import SportsApiClient
+from player_index import PlayerNameIndex, common_name
+from squad_snapshot import SquadSnapshot
+from batch_writer import BatchedUpserter
+from storage import create_store
+import metrics
 
 # --- CONFIGURATION ---
 load_dotenv() # Load environment variables from .env file
-SUPABASE_URL = os.environ.get("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.environ.get("SUPABASE_SERVICE_KEY")
 OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
 
 # --- IMAGE SEARCH FUNCTION ---
-async def search_player_image(player_name):
+async def search_player_image(client, player_name):
     """
-    Searches for a player image using the SportsApiClient.
+    Searches for a player image using the shared SportsApiClient.
     This provides a more reliable source for player headshots than generic search.
     """
-    print(f"Initializing SportsApiClient to search for image of {player_name}...")
+    print(f"Searching SportsApiClient for an image of {player_name}...")
     try:
-        client = SportsApiClient()
         # Using a hardcoded team_id for Arsenal (42) as this app is Arsenal-specific.
         image_url = await client.get_player_image(player_name, team_id=42)
         
@@ -38,120 +44,294 @@ async def search_player_image(player_name):
         return None
 
 # --- ENHANCE ARTICLES WITH BETTER IMAGES ---
-async def enhance_articles_with_images(processed_articles):
+# Maximum number of player image lookups in flight at once
+IMAGE_LOOKUP_CONCURRENCY = int(os.environ.get("IMAGE_LOOKUP_CONCURRENCY", "8"))
+# Image URLs containing these words are placeholders rather than player photos
+GENERIC_IMAGE_TERMS = KeywordMatcher(['logo', 'badge', 'stadium', 'generic', 'placeholder'], prefix=True)
+
+def needs_better_image(article):
+    """Returns True if an article has no image or only a generic one."""
+    player_name = article["player_name"]
+
+    # If no image_url or it's null/None, definitely search
+    if not article.get("image_url") or article["image_url"] is None:
+        print(f"No image found for {player_name}, will search for one")
+        return True
+
+    # If we have an image but it contains generic terms, search for a better one
+    if isinstance(article["image_url"], str):
+        if GENERIC_IMAGE_TERMS.search(article["image_url"]):
+            print(f"Found generic image for {player_name}, will search for a better one")
+            return True
+
+    return False
+
+async def enhance_articles_with_images(processed_articles, client=None, semaphore=None):
     """
     Enhances articles by searching for better player images when needed.
+    Lookups run concurrently through a single SportsApiClient, which
+    rate-limits each provider and shares one lookup between articles about
+    the same player. Pass `client` to share one across calls; otherwise one
+    is opened for this call. Likewise, pass `semaphore` to cap the lookups
+    in flight across calls; otherwise this call alone is capped at
+    IMAGE_LOOKUP_CONCURRENCY.
     """
-    enhanced_articles = []
-    
-    for article in processed_articles:
-        # If the article has no player name, skip enhancement
-        if not article.get("player_name"):
-            enhanced_articles.append(article)
-            continue
-            
+    if client is None:
+        async with SportsApiClient() as client:
+            return await enhance_articles_with_images(processed_articles, client, semaphore)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(IMAGE_LOOKUP_CONCURRENCY)
+
+    async def enhance(article):
         player_name = article["player_name"]
-        
-        # Check if we should search for a new image
-        should_search_image = False
-        
-        # If no image_url or it's null/None, definitely search
-        if not article.get("image_url") or article["image_url"] is None:
-            should_search_image = True
-            print(f"No image found for {player_name}, will search for one")
-        
-        # If we have an image but it contains generic terms, search for a better one
-        elif isinstance(article["image_url"], str):
-            generic_terms = ['logo', 'badge', 'stadium', 'generic', 'placeholder']
-            if any(term in article["image_url"].lower() for term in generic_terms):
-                should_search_image = True
-                print(f"Found generic image for {player_name}, will search for a better one")
-        
-        # Search for a player-specific image if needed
-        if should_search_image:
+        async with semaphore:
             print(f"Searching for image for {player_name}...")
-            image_url = await search_player_image(player_name)
-            if image_url:
-                article["image_url"] = image_url
-                print(f"Found image for {player_name}: {image_url}")
+            image_url = await search_player_image(client, player_name)
+        if image_url:
+            article["image_url"] = image_url
+            print(f"Found image for {player_name}: {image_url}")
+        else:
+            print(f"Could not find image for {player_name}")
+
+    # Articles without a player name are left as they are
+    pending = [
+        article for article in processed_articles
+        if article.get("player_name") and needs_better_image(article)
+    ]
+    # One batched Wikipedia request covers the fallback for every player
+    await client.prefetch_wikipedia_images([article["player_name"] for article in pending], team_id=42)
+    await asyncio.gather(*(enhance(article) for article in pending))
+    return processed_articles
+
+# --- PLAYER NAMES ---
+def load_player_index():
+    """
+    Loads the canonical player names from earlier runs and adds the stored
+    Arsenal squad, so LLM output like "Saka" resolves to "Bukayo Saka".
+    """
+    player_index = PlayerNameIndex.load()
+    for player in SquadSnapshot(42).players:
+        # The canonical id (and upsert key) is the name already stored, or
+        # else the name the player is known by, never the legal full name
+        name = common_name(player["names"])
+        player_id = player_index.resolve(name) or name
+        player_index.add(player_id, [name, *player["names"]])
+    return player_index
+
+# --- STREAMING PIPELINE ---
+# How long a partly filled LLM chunk waits for more articles before it is sent anyway
+CHUNK_LINGER_SECONDS = float(os.environ.get("LLM_CHUNK_LINGER", "5"))
+
+async def run_pipeline(news_scraper, store, writer, classifier, player_index, api_key):
+    """
+    Runs the scrape -> dedup/relevance -> clustering -> LLM -> images -> upsert
+    stages concurrently, connected by queues. Each source's articles move on
+    as soon as that source finishes, an LLM chunk is sent as soon as it is
+    full (or has waited CHUNK_LINGER_SECONDS for more articles), and stories
+    are enriched and written as soon as their chunk is answered. Breaking
+    news therefore waits for its own path through the stages, not for the
+    slowest source or chunk.
+
+    Returns:
+        Article counts per step, the number of LLM chunks that failed and
+        the summed write stats.
+    """
+    start = time.perf_counter()
+    counts = {"scraped": 0, "new": 0, "relevant": 0, "clustered": 0, "stories": 0, "failed_chunks": 0}
+    write_stats = {"written": 0, "unchanged": 0, "failed": 0}
+    batches = asyncio.Queue()      # per-source article lists
+    candidates = asyncio.Queue()   # new, relevant article lists
+    chunks = asyncio.Queue()       # LLM chunks
+    stories = asyncio.Queue()      # new or changed merged stories
+    rows = asyncio.Queue()         # enriched stories, ready to store
+
+    async def scrape_stage():
+        with metrics.span("stage", stage="scrape"):
+            async for articles in news_scraper.iter_sources():
+                counts["scraped"] += len(articles)
+                await batches.put(articles)
+        await batches.put(None)
+
+    async def filter_stage():
+        seen_urls = set()
+        with metrics.span("stage", stage="dedup"):
+            while (articles := await batches.get()) is not None:
+                articles = [article for article in articles if article['url'] not in seen_urls]
+                seen_urls.update(article['url'] for article in articles)
+                if not articles:
+                    continue
+                try:
+                    # Only look up the URLs scraped from this source
+                    existing_urls = await asyncio.to_thread(
+                        store.existing_urls, [article['url'] for article in articles]
+                    )
+                except Exception as e:
+                    print(f"Warning: Could not fetch existing URLs from storage. May create duplicates. Error: {e}")
+                    existing_urls = set()
+                # Keep only the articles that are not already in our database
+                new_articles = [article for article in articles if article['url'] not in existing_urls]
+                # Drop articles the LLM would almost certainly discard
+                relevant, _ = classifier.filter(new_articles)
+                counts["new"] += len(new_articles)
+                counts["relevant"] += len(relevant)
+                if relevant:
+                    await candidates.put(relevant)
+        await candidates.put(None)
+
+    async def chunk_stage():
+        buffer = []
+
+        async def flush(keep_partial):
+            # Collapse near-duplicates so the LLM gets each story once, with its other sources attached
+            collapsed = collapse_near_duplicates(buffer)
+            # Pack in URL order rather than arrival order, so the same articles
+            # make the same chunks (and LLM cache hits) on the next run. Which
+            # articles are buffered when a chunk fills or lingers out still
+            # depends on source timing; that is the price of streaming.
+            collapsed.sort(key=lambda article: article["url"])
+            packed = chunk_articles(collapsed)
+            if keep_partial and packed:
+                buffer[:] = packed.pop()
             else:
-                print(f"Could not find image for {player_name}")
-        
-        enhanced_articles.append(article)
-    
-    return enhanced_articles
+                buffer.clear()
+            for chunk in packed:
+                counts["clustered"] += len(chunk)
+                await chunks.put(chunk)
+
+        with metrics.span("stage", stage="cluster"):
+            while True:
+                try:
+                    timeout = CHUNK_LINGER_SECONDS if buffer else None
+                    articles = await asyncio.wait_for(candidates.get(), timeout)
+                except asyncio.TimeoutError:
+                    await flush(keep_partial=False)
+                    continue
+                if articles is None:
+                    await flush(keep_partial=False)
+                    break
+                buffer.extend(articles)
+                if sum(estimate_tokens(article) for article in buffer) >= CHUNK_TOKEN_BUDGET:
+                    await flush(keep_partial=True)
+        await chunks.put(None)
+
+    async def llm_stage():
+        merger = StoryMerger(player_index)
+        with metrics.span("stage", stage="llm"):
+            async for chunk_stories in stream_with_llm(chunks, api_key, classifier):
+                if chunk_stories is None:
+                    counts["failed_chunks"] += 1
+                    continue
+                changed = merger.add(chunk_stories)
+                if changed:
+                    await stories.put(changed)
+        counts["stories"] = len(merger.stories())
+        await stories.put(None)
+
+    async def image_stage():
+        # One cap on lookups in flight for all batches together
+        semaphore = asyncio.Semaphore(IMAGE_LOOKUP_CONCURRENCY)
+
+        async def enhance(batch):
+            await enhance_articles_with_images(batch, client, semaphore)
+            await rows.put(batch)
+
+        with metrics.span("stage", stage="images"):
+            async with SportsApiClient() as client, asyncio.TaskGroup() as group:
+                while (batch := await stories.get()) is not None:
+                    group.create_task(enhance(batch))
+        await rows.put(None)
+
+    async def upsert_stage():
+        first_write = True
+        finished = False
+        with metrics.span("stage", stage="upsert"):
+            while not finished:
+                batch = await rows.get()
+                if batch is None:
+                    break
+                # Write everything that is ready in one go
+                while not rows.empty():
+                    more = rows.get_nowait()
+                    if more is None:
+                        finished = True
+                        break
+                    batch = batch + more
+                # 'upsert' will insert new rows or update existing ones if the player_name matches
+                stats = await asyncio.to_thread(writer.write, batch)
+                for result, count in stats.items():
+                    write_stats[result] += count
+                if first_write:
+                    first_write = False
+                    metrics.observe("first_write_seconds", time.perf_counter() - start)
+                    print(f"First stories stored {time.perf_counter() - start:.1f}s after the run started.")
+            # Still retry rows spooled by a failed earlier run
+            stats = await asyncio.to_thread(writer.write, [])
+            for result, count in stats.items():
+                write_stats[result] += count
+
+    async with asyncio.TaskGroup() as group:
+        for stage in (scrape_stage, filter_stage, chunk_stage, llm_stage, image_stage, upsert_stage):
+            group.create_task(stage())
+
+    for step, count in counts.items():
+        if step != "failed_chunks":
+            metrics.increment("articles", count, step=step)
+    for result, count in write_stats.items():
+        metrics.increment("rows", count, result=result)
+    return {**counts, **write_stats}
 
 # --- ASYNC MAIN ---
 async def main():
-    # 1. Initialize Supabase client
-    assert SUPABASE_URL, "SUPABASE_URL not found in environment variables."
-    assert SUPABASE_SERVICE_KEY, "SUPABASE_SERVICE_KEY not found in environment variables."
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-
-    # 2. Scrape News from RSS Feeds
+    # Storage (Supabase, or a local SQLite stand-in) and the run's state
+    store = create_store()
     news_scraper = NewsScraper()
-    raw_articles = await news_scraper.scrape_all()
-    print(f"Scraped a total of {len(raw_articles)} raw articles.")
+    writer = BatchedUpserter(store, on_conflict='player_name')
+    classifier = RelevanceClassifier()
+    player_index = load_player_index()
 
-    # 3. Filter out articles already in the database
-    if not raw_articles:
-        print("No articles found to process.")
-        return
+    # Scrape, filter, process with the LLM, enrich and store, all streaming
+    print("Starting streaming scrape pipeline...")
+    counts = await run_pipeline(news_scraper, store, writer, classifier, player_index, OPENROUTER_API_KEY)
+    print(
+        f"Scraped {counts['scraped']} articles: {counts['new']} new, {counts['relevant']} relevant, "
+        f"{counts['clustered']} after clustering, {counts['stories']} stories."
+    )
+    print(
+        f"Upserted {counts['written']} articles "
+        f"({counts['unchanged']} unchanged, {counts['failed']} failed)."
+    )
 
-    try:
-        # Get all URLs currently in our database
-        response = supabase.table('transfer_news').select('url').execute()
-        existing_urls = {item['url'] for item in response.data}
-        print(f"Found {len(existing_urls)} existing articles in the database.")
-    except Exception as e:
-        print(f"Warning: Could not fetch existing URLs from Supabase. May create duplicates. Error: {e}")
-        existing_urls = set()
-
-    # Keep only the articles that are not already in our database
-    new_articles = [article for article in raw_articles if article['url'] not in existing_urls]
-    
-    print(f"Found {len(new_articles)} new articles to process.")
-
-    if not new_articles:
-        print("No new articles to process.")
-        return
-
-    # 4. Process with LLM via OpenRouter
-    print("Processing content with LLM...")
-    processed_articles = await process_with_llm(new_articles, OPENROUTER_API_KEY)
-    print(f"LLM processing complete. {len(processed_articles)} articles ready for insertion.")
-
-    # 5. Enhance articles with better images
-    enhanced_articles = await enhance_articles_with_images(processed_articles)
-    print(f"Enhanced {len(enhanced_articles)} articles with better images.")
-
-    # 6. Save to Supabase
-    if enhanced_articles:
-        print("Saving processed articles to Supabase...")
-        try:
-            # 'upsert' will insert new rows or update existing ones if the player_name matches
-            data, count = supabase.table('transfer_news').upsert(
-                enhanced_articles, 
-                on_conflict='player_name'
-            ).execute()
-            print(f"Successfully upserted {len(data[1])} articles into Supabase.")
-        except Exception as e:
-            print(f"Error saving to Supabase: {e}")
-            raise
-    
+    # Only remember what we have seen once it is safely stored. If the LLM
+    # failed on some chunks, their articles were never processed: keep the
+    # old cursors and feed validators so the next run fetches them again.
+    if counts["failed_chunks"]:
+        print(f"{counts['failed_chunks']} LLM chunks failed; keeping source state for a retry.")
+    else:
+        news_scraper.save_state()
+    player_index.save()
+    classifier.save()
+    if writer.unsaved:
+        # The failed rows are spooled and retried next run, but flag the job
+        raise RuntimeError(f"{writer.unsaved} articles could not be saved.")
     print("Scraping task finished.")
 
 # --- ENTRY POINT for direct execution ---
 # This allows the script to be run from the command line by GitHub Actions
 if __name__ == "__main__":
+    # Debug output (e.g. where each RSS image came from) needs LOG_LEVEL=DEBUG
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING").upper(),
+                        format="%(levelname)s %(name)s: %(message)s")
     print("Starting scheduled scrape task...")
     try:
-        asyncio.run(main())
+        with metrics.span("run"):
+            asyncio.run(main())
         print("Scraping and processing completed successfully.")
     except Exception as e:
         print(f"An error occurred: {e}")
         # Exit with a non-zero status code to indicate failure to GitHub Actions
         exit(1)
+    finally:
+        metrics.export()
 
 # --- HELPER MODULES (to be created next) ---
 # We will create the following files next:
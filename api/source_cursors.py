@@ -0,0 +1,39 @@
+from datetime import datetime, timezone
+from state import load_json, save_json
+
+CURSOR_STATE_FILE = "source_cursors.json"
+
+
+class SourceCursorStore:
+    """
+    Keeps a high-water mark per source (e.g. the newest tweet id seen for a
+    journalist) so each run only needs to look at items newer than the mark.
+
+    Like the feed validators, new marks are staged with `advance()` and only
+    written by `save()` once the run has been stored successfully.
+    """
+    def __init__(self):
+        self.cursors = load_json(CURSOR_STATE_FILE, {})
+        self._pending = {}
+
+    def get(self, source: str) -> int | None:
+        """Returns the saved high-water mark for a source, if any."""
+        cursor = self.cursors.get(source)
+        return cursor["last_id"] if cursor else None
+
+    def advance(self, source: str, last_id: int):
+        """Stages a new high-water mark; marks never move backwards."""
+        current = max(self.get(source) or 0, self._pending.get(source, {}).get("last_id", 0))
+        if last_id > current:
+            self._pending[source] = {
+                "last_id": last_id,
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }
+
+    def save(self):
+        """Persists the marks staged during this run."""
+        if not self._pending:
+            return
+        self.cursors.update(self._pending)
+        self._pending = {}
+        save_json(CURSOR_STATE_FILE, self.cursors)
@@ -6,10 +6,67 @@ from typing import Dict, Any, Optional, List
 from dotenv import load_dotenv
 import re
 from pathlib import Path
+import metrics
+from image_cache import PlayerImageCache
+from keyword_matcher import KeywordMatcher
+from player_index import normalize_player_name
+from squad_snapshot import SquadSnapshot
 
 # Load environment variables from .env file
 load_dotenv()
 
+# HTTP/2 needs the optional `h2` package (installed via httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Per-provider request budgets as (calls, period in seconds), chosen to stay
+# inside each service's free tier.
+PROVIDER_RATE_LIMITS = {
+    "api-football": (10, 60.0),
+    "sportmonks": (50, 60.0),
+    "thesportsdb": (30, 60.0),
+    "wikipedia": (100, 60.0),
+}
+
+# Wikipedia short descriptions of players, and of people who are not (or no longer) players
+FOOTBALLER_TERMS = KeywordMatcher(["footballer", "football player", "soccer player"])
+NON_PLAYER_TERMS = KeywordMatcher(
+    ["former", "retired", "pundit", "broadcaster", "presenter", "manager", "coach", "executive"]
+)
+# Returned by a provider lookup whose request failed (an HTTP error, timeout or
+# unreadable response), as opposed to None for a provider that has no image
+LOOKUP_FAILED = object()
+
+# Image file names that point to something other than a player photo. Whole
+# words only, so "kit" matches "Arsenal_home_kit.jpg" but not "kitchen_staff.jpg".
+NON_PORTRAIT_IMAGE_TERMS = KeywordMatcher(
+    ["logo", "logos", "icon", "icons", "badge", "badges", "kit", "kits", "flag", "flags"]
+)
+
+
+class ProviderRateLimiter:
+    """
+    Spaces out requests to a single provider so that at most `max_calls`
+    start within any `period` seconds, however many lookups run concurrently.
+    """
+    def __init__(self, max_calls: int, period: float):
+        self.interval = period / max_calls
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        """Waits until the next request slot for this provider is free."""
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
 class SportsApiClient:
     """
     A centralized client to interact with various sports data APIs.
@@ -28,12 +85,12 @@ class SportsApiClient:
         self.wikipedia_access_token = os.getenv('WIKIPEDIA_ACCESS_TOKEN')
         self.user_agent = os.getenv('USER_AGENT', 'AllForGooners/1.0')
         
-        # API base URLs
+        # API base URLs (each overridable from the environment, e.g. to point at a replay stub)
         self.apifootball_host = "v3.football.api-sports.io"
-        self.apifootball_base_url = f"https://{self.apifootball_host}"
-        self.sportmonks_base_url = "https://api.sportmonks.com/v3/football"
-        self.thesportsdb_base_url = "https://www.thesportsdb.com/api/v1/json/3"  # Free tier URL
-        self.wikimedia_base_url = "https://en.wikipedia.org/w/api.php"
+        self.apifootball_base_url = os.getenv('API_FOOTBALL_BASE_URL', f"https://{self.apifootball_host}")
+        self.sportmonks_base_url = os.getenv('SPORTMONKS_BASE_URL', "https://api.sportmonks.com/v3/football")
+        self.thesportsdb_base_url = os.getenv('THESPORTSDB_BASE_URL', "https://www.thesportsdb.com/api/v1/json/3")  # Free tier URL
+        self.wikimedia_base_url = os.getenv('WIKIMEDIA_BASE_URL', "https://en.wikipedia.org/w/api.php")
         
         # Create local directory for downloaded images if it doesn't exist
         self.images_dir = Path("frontend/images/players")
@@ -42,6 +99,54 @@ class SportsApiClient:
         if not self.apifootball_key:
             print("Warning: API-Football API key not found. Image retrieval may fail.")
 
+        # One pooled HTTP client shared by every provider, created on first use
+        self._http_client: httpx.AsyncClient | None = None
+        # Resolved images persisted between runs; saved on aclose()
+        self.image_cache = PlayerImageCache()
+        self.rate_limiters = {
+            provider: ProviderRateLimiter(max_calls, period)
+            for provider, (max_calls, period) in PROVIDER_RATE_LIMITS.items()
+        }
+        # Team rosters from API-Football, loaded or refreshed on first use
+        self._squads: Dict[int, SquadSnapshot] = {}
+        self._squad_locks: Dict[int, asyncio.Lock] = {}
+        # Wikipedia images resolved by prefetch_wikipedia_images, by player name
+        self._wikipedia_images: Dict[str, str] = {}
+        # "sequential" tries providers one by one; "parallel" queries them all at once
+        self.provider_strategy = os.getenv('IMAGE_PROVIDER_STRATEGY', 'sequential')
+        # Lookups currently running, so concurrent requests for the same
+        # player share a single provider chain
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """
+        Returns the shared HTTP client, creating it on first use.
+
+        Connections are kept alive and reused across providers and players,
+        and HTTP/2 is negotiated with hosts that support it.
+        """
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0),
+                timeout=10.0,
+                follow_redirects=True
+            )
+        return self._http_client
+
+    async def aclose(self):
+        """Saves the image cache and closes the shared HTTP client."""
+        self.image_cache.save()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
     async def _get_current_season(self, league_id: int = 39) -> str:
         """
         Fetches the current season for a given league.
@@ -65,7 +170,10 @@ class SportsApiClient:
     async def get_player_image(self, player_name: str, team_id: int) -> str | None:
         """
         Fetches a professional headshot for a given player using multiple APIs.
-        Tries API-Football first, then SportMonks, then TheSportsDB, and finally Wikipedia.
+        Known players (and recent misses, when every provider answered) are
+        answered from the persistent image cache; otherwise tries API-Football first, then SportMonks,
+        then TheSportsDB, and finally Wikipedia (one after another, or all at
+        once with IMAGE_PROVIDER_STRATEGY=parallel).
 
         Args:
             player_name: The full name of the player.
@@ -76,28 +184,167 @@ class SportsApiClient:
         """
         # Normalize the player name
         player_name = player_name.strip()
-        
-        # Try API-Football first
-        image_url = await self._get_image_from_api_football(player_name, team_id)
-        if image_url:
-            return image_url
-            
-        # Then try SportMonks
-        image_url = await self._get_image_from_sportmonks(player_name)
-        if image_url:
-            return image_url
-            
-        # Then try TheSportsDB
-        image_url = await self._get_image_from_thesportsdb(player_name)
-        if image_url:
+
+        hit, image_url, provider = self.image_cache.get(player_name, team_id)
+        metrics.increment("image_cache_lookups", result="hit" if hit else "miss")
+        if hit:
+            print(f"Image cache hit for '{player_name}' ({provider or 'not found'}).")
             return image_url
-            
-        # Finally try Wikipedia as fallback
-        image_url = await self._get_image_from_wikipedia(player_name)
-        if image_url:
+
+        key = self.image_cache.make_key(player_name, team_id)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._resolve_player_image(player_name, team_id))
+            self._inflight[key] = task
+            try:
+                image_url, provider = await task
+            finally:
+                del self._inflight[key]
+            # A miss is only remembered if no provider failed to answer
+            if image_url is LOOKUP_FAILED:
+                print(f"Not caching the missing image for '{player_name}': a provider lookup failed.")
+                return None
+            self.image_cache.put(player_name, team_id, image_url, provider)
             return image_url
-            
-        return None
+
+        print(f"Joining in-flight image lookup for '{player_name}'.")
+        image_url, _ = await asyncio.shield(task)
+        return None if image_url is LOOKUP_FAILED else image_url
+
+    def _provider_lookups(self, player_name: str, team_id: int) -> List[tuple]:
+        """Returns (provider, lookup function) pairs in order of image quality preference."""
+        return [
+            ("api-football", lambda: self._measured("api-football", self._get_image_from_api_football(player_name, team_id))),
+            ("sportmonks", lambda: self._measured("sportmonks", self._get_image_from_sportmonks(player_name))),
+            ("thesportsdb", lambda: self._measured("thesportsdb", self._get_image_from_thesportsdb(player_name))),
+            ("wikipedia", lambda: self._measured("wikipedia", self._get_image_from_wikipedia(player_name))),
+        ]
+
+    @staticmethod
+    async def _measured(provider: str, lookup) -> str | None:
+        """Awaits a provider lookup, recording its latency and outcome."""
+        with metrics.span("image_provider", provider=provider):
+            image_url = await lookup
+        if image_url is LOOKUP_FAILED:
+            result = "error"
+        else:
+            result = "found" if image_url else "not_found"
+        metrics.increment("image_provider_lookups", provider=provider, result=result)
+        return image_url
+
+    async def _resolve_player_image(self, player_name: str, team_id: int) -> tuple[str | None, str | None]:
+        """
+        Queries the image providers in order of preference: API-Football,
+        SportMonks, TheSportsDB, then Wikipedia. With the "parallel" provider
+        strategy all of them are queried at once instead, and the answer from
+        the highest-priority provider that has an image wins.
+
+        Returns:
+            A (image_url, provider) tuple, (None, None) if no provider has an
+            image, or (LOOKUP_FAILED, None) if none has one but any of them
+            failed to answer.
+        """
+        if self.provider_strategy == "parallel":
+            return await self._resolve_player_image_parallel(player_name, team_id)
+
+        failed = False
+        for provider, lookup in self._provider_lookups(player_name, team_id):
+            image_url = await lookup()
+            if image_url is LOOKUP_FAILED:
+                failed = True
+            elif image_url:
+                return image_url, provider
+
+        return (LOOKUP_FAILED if failed else None), None
+
+    async def _resolve_player_image_parallel(self, player_name: str, team_id: int) -> tuple[str | None, str | None]:
+        """
+        Starts every provider lookup at once and walks the results in priority
+        order. As soon as a provider answers with an image, all lower-priority
+        lookups still running are cancelled.
+        """
+        tasks = [
+            (provider, asyncio.create_task(lookup()))
+            for provider, lookup in self._provider_lookups(player_name, team_id)
+        ]
+        failed = False
+        try:
+            for provider, task in tasks:
+                try:
+                    image_url = await task
+                except Exception as e:
+                    print(f"Error from {provider} for '{player_name}': {e}")
+                    image_url = LOOKUP_FAILED
+                if image_url is LOOKUP_FAILED:
+                    failed = True
+                elif image_url:
+                    return image_url, provider
+            return (LOOKUP_FAILED if failed else None), None
+        finally:
+            for _, task in tasks:
+                task.cancel()
+
+    async def get_squad(self, team_id: int) -> SquadSnapshot:
+        """
+        Returns the squad snapshot for a team, refreshing it from API-Football
+        (a few paginated /players calls) when the stored copy is stale.
+
+        Args:
+            team_id: The team ID in API-Football's system.
+
+        Returns:
+            The team's SquadSnapshot; it may be empty if it could not be fetched.
+        """
+        lock = self._squad_locks.setdefault(team_id, asyncio.Lock())
+        async with lock:
+            squad = self._squads.get(team_id)
+            if squad is None:
+                squad = SquadSnapshot(team_id)
+                self._squads[team_id] = squad
+            if squad.is_stale() and self.apifootball_key:
+                players = await self._fetch_squad_players(team_id)
+                if players:
+                    squad.replace(players)
+                    print(f"Stored squad snapshot of {len(players)} players for team {team_id}.")
+            return squad
+
+    async def _fetch_squad_players(self, team_id: int) -> List[Dict[str, Any]]:
+        """Fetches every player of a team for the current season, page by page."""
+        current_season = await self._get_current_season()
+        headers = {'x-apisports-key': self.apifootball_key}
+        client = self._get_http_client()
+        players = []
+        page = 1
+        total_pages = 1
+        try:
+            while page <= total_pages:
+                await self.rate_limiters["api-football"].wait()
+                response = await client.get(
+                    f"{self.apifootball_base_url}/players",
+                    headers=headers,
+                    params={"team": str(team_id), "season": current_season, "page": page},
+                    timeout=10.0
+                )
+                response.raise_for_status()
+                data = response.json()
+                for item in data.get("response", []):
+                    player = item["player"]
+                    full_name = f"{player.get('firstname') or ''} {player.get('lastname') or ''}".strip()
+                    names = [name for name in dict.fromkeys([full_name, player.get("name")]) if name]
+                    if names and player.get("photo"):
+                        players.append({"id": player["id"], "names": names, "photo": player["photo"]})
+                total_pages = data.get("paging", {}).get("total", 1)
+                page += 1
+        except httpx.HTTPStatusError as e:
+            print(f"Error response {e.response.status_code} while fetching squad for team {team_id}.")
+            return []
+        except httpx.RequestError as e:
+            print(f"Error requesting {e.request.url!r}.")
+            return []
+        except (KeyError, TypeError) as e:
+            print(f"Error parsing API-Football squad response: {e}")
+            return []
+        return players
 
     async def _get_image_from_api_football(self, player_name: str, team_id: int) -> str | None:
         """
@@ -108,10 +355,18 @@ class SportsApiClient:
             team_id: The team ID in API-Football's system.
             
         Returns:
-            The URL of the player's image, or None if not found.
+            The URL of the player's image, None if not found, or LOOKUP_FAILED
+            if the request failed.
         """
         if not self.apifootball_key:
             return None
+
+        # Squad members are answered from the local snapshot
+        squad_player = (await self.get_squad(team_id)).find(player_name)
+        metrics.increment("squad_snapshot_lookups", result="hit" if squad_player else "miss")
+        if squad_player:
+            print(f"Found {player_name} in the squad snapshot: {squad_player['photo']}")
+            return squad_player["photo"]
             
         print(f"Trying API-Football for '{player_name}'...")
         
@@ -126,33 +381,34 @@ class SportsApiClient:
             "season": current_season
         }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    f"{self.apifootball_base_url}/players",
-                    headers=headers,
-                    params=params,
-                    timeout=10.0
-                )
-                response.raise_for_status()
-                data = response.json()
+        client = self._get_http_client()
+        try:
+            await self.rate_limiters["api-football"].wait()
+            response = await client.get(
+                f"{self.apifootball_base_url}/players",
+                headers=headers,
+                params=params,
+                timeout=10.0
+            )
+            response.raise_for_status()
+            data = response.json()
                 
-                if data.get("results", 0) > 0 and data["response"]:
-                    player_photo_url = data["response"][0]["player"]["photo"]
-                    print(f"Found image for {player_name}: {player_photo_url}")
-                    return player_photo_url
-                else:
-                    print(f"No image found for {player_name} at API-Football.")
-                    print(f"API Response: {data}")
-                    return None
-
-            except httpx.HTTPStatusError as e:
-                print(f"Error response {e.response.status_code} while requesting {e.request.url!r}.")
-                return None
-            except httpx.RequestError as e:
-                print(f"Error requesting {e.request.url!r}.")
+            if data.get("results", 0) > 0 and data["response"]:
+                player_photo_url = data["response"][0]["player"]["photo"]
+                print(f"Found image for {player_name}: {player_photo_url}")
+                return player_photo_url
+            else:
+                print(f"No image found for {player_name} at API-Football.")
+                print(f"API Response: {data}")
                 return None
 
+        except httpx.HTTPStatusError as e:
+            print(f"Error response {e.response.status_code} while requesting {e.request.url!r}.")
+            return LOOKUP_FAILED
+        except httpx.RequestError as e:
+            print(f"Error requesting {e.request.url!r}.")
+            return LOOKUP_FAILED
+
     async def _get_image_from_thesportsdb(self, player_name: str) -> str | None:
         """
         Attempts to fetch a player image from TheSportsDB.
@@ -161,7 +417,8 @@ class SportsApiClient:
             player_name: The player's name to search for.
             
         Returns:
-            The URL of the player's image, or None if not found.
+            The URL of the player's image, None if not found, or LOOKUP_FAILED
+            if the request failed.
         """
         print(f"Trying TheSportsDB for '{player_name}'...")
         
@@ -169,53 +426,54 @@ class SportsApiClient:
         # TheSportsDB search works better with spaces replaced by underscores
         formatted_name = player_name.replace(" ", "_")
         
-        async with httpx.AsyncClient() as client:
-            try:
-                # Search for the player
-                response = await client.get(
-                    f"{self.thesportsdb_base_url}/searchplayers.php",
-                    params={"p": formatted_name},
-                    timeout=10.0
-                )
-                response.raise_for_status()
-                data = response.json()
+        client = self._get_http_client()
+        try:
+            # Search for the player
+            await self.rate_limiters["thesportsdb"].wait()
+            response = await client.get(
+                f"{self.thesportsdb_base_url}/searchplayers.php",
+                params={"p": formatted_name},
+                timeout=10.0
+            )
+            response.raise_for_status()
+            data = response.json()
                 
-                # Check if players were found
-                if data.get("player") and len(data["player"]) > 0:
-                    # Look for Arsenal players specifically
-                    arsenal_players = [p for p in data["player"] 
-                                      if p.get("strTeam") == "Arsenal" 
-                                      or "Arsenal" in p.get("strTeam", "")]
+            # Check if players were found
+            if data.get("player") and len(data["player"]) > 0:
+                # Look for Arsenal players specifically
+                # Exact folded team match, so "Arsenal Tula" is not taken for Arsenal
+                arsenal_players = [p for p in data["player"]
+                                  if normalize_player_name(p.get("strTeam") or "") == "arsenal"]
                     
-                    # Use Arsenal player if found, otherwise use the first result
-                    player = arsenal_players[0] if arsenal_players else data["player"][0]
+                # Use Arsenal player if found, otherwise use the first result
+                player = arsenal_players[0] if arsenal_players else data["player"][0]
                     
-                    # Get the player image - TheSportsDB offers multiple image types
-                    image_url = player.get("strCutout")  # Cutout has transparent background
-                    if not image_url:
-                        image_url = player.get("strThumb")  # Regular thumbnail
-                    if not image_url:
-                        image_url = player.get("strRender")  # Full body render
+                # Get the player image - TheSportsDB offers multiple image types
+                image_url = player.get("strCutout")  # Cutout has transparent background
+                if not image_url:
+                    image_url = player.get("strThumb")  # Regular thumbnail
+                if not image_url:
+                    image_url = player.get("strRender")  # Full body render
                     
-                    if image_url:
-                        print(f"Found image for {player_name} at TheSportsDB: {image_url}")
-                        return image_url
-                    else:
-                        print(f"No image found for {player_name} at TheSportsDB.")
-                        return None
+                if image_url:
+                    print(f"Found image for {player_name} at TheSportsDB: {image_url}")
+                    return image_url
                 else:
-                    print(f"No player data found for {player_name} at TheSportsDB.")
+                    print(f"No image found for {player_name} at TheSportsDB.")
                     return None
-                    
-            except httpx.HTTPStatusError as e:
-                print(f"TheSportsDB error response {e.response.status_code} while requesting {e.request.url!r}.")
-                return None
-            except httpx.RequestError as e:
-                print(f"Error requesting {e.request.url!r} from TheSportsDB.")
-                return None
-            except (KeyError, IndexError, json.JSONDecodeError) as e:
-                print(f"Error parsing TheSportsDB response: {e}")
+            else:
+                print(f"No player data found for {player_name} at TheSportsDB.")
                 return None
+                    
+        except httpx.HTTPStatusError as e:
+            print(f"TheSportsDB error response {e.response.status_code} while requesting {e.request.url!r}.")
+            return LOOKUP_FAILED
+        except httpx.RequestError as e:
+            print(f"Error requesting {e.request.url!r} from TheSportsDB.")
+            return LOOKUP_FAILED
+        except (KeyError, IndexError, json.JSONDecodeError) as e:
+            print(f"Error parsing TheSportsDB response: {e}")
+            return LOOKUP_FAILED
 
     async def _get_image_from_sportmonks(self, player_name: str) -> str | None:
         """
@@ -225,7 +483,8 @@ class SportsApiClient:
             player_name: The player's name to search for.
             
         Returns:
-            The URL of the player's image, or None if not found.
+            The URL of the player's image, None if not found, or LOOKUP_FAILED
+            if the request failed.
         """
         if not self.sportmonks_key:
             return None
@@ -237,160 +496,206 @@ class SportsApiClient:
             "api_token": self.sportmonks_key
         }
             
-        async with httpx.AsyncClient() as client:
-            try:
-                # The search query must be part of the URL path, not a query parameter.
-                response = await client.get(
-                    f"{self.sportmonks_base_url}/players/search/{player_name}",
-                    params=params,
-                    timeout=10.0
-                )
-                response.raise_for_status()
-                data = response.json()
+        client = self._get_http_client()
+        try:
+            # The search query must be part of the URL path, not a query parameter.
+            await self.rate_limiters["sportmonks"].wait()
+            response = await client.get(
+                f"{self.sportmonks_base_url}/players/search/{player_name}",
+                params=params,
+                timeout=10.0
+            )
+            response.raise_for_status()
+            data = response.json()
                 
-                if data.get("data") and len(data["data"]) > 0:
-                    player = data["data"][0]
+            if data.get("data") and len(data["data"]) > 0:
+                player = data["data"][0]
                     
-                    # Look for the image in the included media
-                    if "media" in player and len(player["media"]) > 0:
-                        for media_item in player["media"]:
-                            if media_item.get("type") == "image":
-                                image_url = media_item.get("url")
-                                if image_url:
-                                    print(f"Found image for {player_name} at SportMonks: {image_url}")
-                                    return image_url
+                # Look for the image in the included media
+                if "media" in player and len(player["media"]) > 0:
+                    for media_item in player["media"]:
+                        if media_item.get("type") == "image":
+                            image_url = media_item.get("url")
+                            if image_url:
+                                print(f"Found image for {player_name} at SportMonks: {image_url}")
+                                return image_url
                     
-                    print(f"No image found in media data for {player_name} at SportMonks.")
-                    return None
-                else:
-                    print(f"No player data found for {player_name} at SportMonks.")
-                    return None
+                print(f"No image found in media data for {player_name} at SportMonks.")
+                return None
+            else:
+                print(f"No player data found for {player_name} at SportMonks.")
+                return None
                     
+        except httpx.HTTPStatusError as e:
+            print(f"SportMonks error response {e.response.status_code} while requesting {e.request.url!r}.")
+            return LOOKUP_FAILED
+        except httpx.RequestError as e:
+            print(f"Error requesting {e.request.url!r} from SportMonks.")
+            return LOOKUP_FAILED
+
+    @staticmethod
+    def _wikipedia_page_image(page: Dict[str, Any]) -> str | None:
+        """
+        Returns the lead image thumbnail of a Wikipedia page, skipping
+        disambiguation pages and images that look like logos, kits or flags.
+        """
+        if page.get("missing") or "disambiguation" in page.get("pageprops", {}):
+            return None
+        image_name = page.get("pageimage", "").lower()
+        if not image_name.endswith((".jpg", ".jpeg")) or NON_PORTRAIT_IMAGE_TERMS.search(image_name):
+            return None
+        return page.get("thumbnail", {}).get("source")
+
+    @staticmethod
+    def _is_footballer_page(page: Dict[str, Any]) -> bool:
+        """
+        True if a page's short description is about an active footballer,
+        e.g. "English footballer (born 2001)", but not "English football
+        pundit and former footballer".
+        """
+        description = page.get("description") or ""
+        return FOOTBALLER_TERMS.search(description) and not NON_PLAYER_TERMS.search(description)
+
+    async def prefetch_wikipedia_images(self, player_names: List[str], team_id: int | None = None):
+        """
+        Resolves Wikipedia images for many players in one request per 50
+        names, by looking their names up directly as page titles (following
+        redirects such as "Martin Odegaard" -> "Martin Ødegaard"). Pages whose
+        description is not about an active footballer are ignored, so "Alex
+        Scott" does not pick up the pundit. Found images are remembered for
+        `_get_image_from_wikipedia`; names that do not resolve fall back to
+        its per-player search.
+
+        Args:
+            player_names: The player names to resolve.
+            team_id: The team ID used for image cache lookups; players
+                already in the cache are skipped.
+        """
+        names = [name.strip() for name in dict.fromkeys(player_names) if name and name.strip()]
+        names = [
+            name for name in names
+            if name not in self._wikipedia_images and not self.image_cache.get(name, team_id)[0]
+        ]
+        headers = {'User-Agent': self.user_agent}
+        client = self._get_http_client()
+
+        for i in range(0, len(names), 50):
+            batch = names[i:i + 50]
+            params = {
+                "action": "query",
+                "format": "json",
+                "titles": "|".join(batch),
+                "redirects": 1,
+                "prop": "pageimages|pageprops|description",
+                "piprop": "thumbnail|name",
+                "pithumbsize": 500,
+                "ppprop": "disambiguation",
+                "formatversion": 2
+            }
+            try:
+                await self.rate_limiters["wikipedia"].wait()
+                response = await client.get(self.wikimedia_base_url, params=params, headers=headers, timeout=10.0)
+                response.raise_for_status()
+                query = response.json().get("query", {})
             except httpx.HTTPStatusError as e:
-                print(f"SportMonks error response {e.response.status_code} while requesting {e.request.url!r}.")
-                return None
+                print(f"Wikipedia error response {e.response.status_code} while prefetching images.")
+                continue
             except httpx.RequestError as e:
-                print(f"Error requesting {e.request.url!r} from SportMonks.")
-                return None
+                print(f"Error requesting {e.request.url!r} from Wikipedia.")
+                continue
+            except (ValueError, KeyError) as e:
+                print(f"Error parsing Wikipedia response while prefetching images: {e}")
+                continue
+
+            # Map each requested name through title normalization and redirects
+            renames = {
+                item.get("from"): item.get("to")
+                for item in query.get("normalized", []) + query.get("redirects", [])
+            }
+            images = {
+                page.get("title"): self._wikipedia_page_image(page)
+                for page in query.get("pages", [])
+                if self._is_footballer_page(page)
+            }
+            for name in batch:
+                title = name
+                for _ in range(3):
+                    if title not in renames:
+                        break
+                    title = renames[title]
+                image_url = images.get(title)
+                if image_url:
+                    self._wikipedia_images[name] = image_url
+            print(f"Prefetched Wikipedia images for {sum(name in self._wikipedia_images for name in batch)}/{len(batch)} players.")
 
     async def _get_image_from_wikipedia(self, player_name: str) -> str | None:
         """
         Fetches an image from Wikipedia for the given player.
+
+        Uses the batch prefetch result when there is one, otherwise a single
+        `generator=search` request that returns the top page's lead image.
         
         Args:
             player_name: The name of the player to search for.
             
         Returns:
-            The URL of the player's image, or None if not found.
+            The URL of the player's image, None if not found, or LOOKUP_FAILED
+            if the request failed.
         """
+        if player_name in self._wikipedia_images:
+            return self._wikipedia_images[player_name]
+
         print(f"Trying Wikipedia for '{player_name}'...")
         headers = {'User-Agent': self.user_agent}
-        
-        # First, find the Wikipedia page for the player
-        search_params = {
+        params = {
             "action": "query",
             "format": "json",
-            "list": "search",
-            "srsearch": f"{player_name} footballer Arsenal",  # Adding "footballer Arsenal" improves results
+            "generator": "search",
+            "gsrsearch": f"{player_name} footballer Arsenal",  # Adding "footballer Arsenal" improves results
+            "gsrlimit": 1,
+            "prop": "pageimages|pageprops",
+            "piprop": "thumbnail|name",
+            "pithumbsize": 500,  # Request a 500px width version
+            "ppprop": "disambiguation",
             "utf8": 1,
             "formatversion": 2
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                search_response = await client.get(
-                    self.wikimedia_base_url,
-                    params=search_params,
-                    headers=headers,
-                    timeout=10.0
-                )
-                search_response.raise_for_status()
-                search_data = search_response.json()
-                
-                if not search_data.get("query", {}).get("search"):
-                    print(f"No Wikipedia page found for {player_name}.")
-                    return None
-                    
-                # Get the page title of the first search result
-                page_title = search_data["query"]["search"][0]["title"]
-                
-                # Now get the images from this page
-                image_params = {
-                    "action": "query",
-                    "format": "json",
-                    "titles": page_title,
-                    "prop": "images",
-                    "imlimit": 50,  # Get up to 50 images
-                    "formatversion": 2
-                }
-                
-                image_response = await client.get(
-                    self.wikimedia_base_url,
-                    params=image_params,
-                    headers=headers,
-                    timeout=10.0
-                )
-                image_response.raise_for_status()
-                image_data = image_response.json()
-                
-                # Extract image names, filter out SVG and low quality images
-                image_names = []
-                if image_data.get("query", {}).get("pages"):
-                    page = image_data["query"]["pages"][0]
-                    if page.get("images"):
-                        for image in page["images"]:
-                            img_name = image.get("title", "")
-                            # Skip SVG, PNG diagrams, and small icons
-                            if (img_name.endswith(".jpg") or img_name.endswith(".jpeg")) and \
-                               not any(x in img_name.lower() for x in ["logo", "icon", "badge", "kit", "flag"]):
-                                image_names.append(img_name)
-                
-                if not image_names:
-                    print(f"No suitable images found for {player_name} on Wikipedia.")
-                    return None
-                
-                # Get URL for the first suitable image
-                img_name = image_names[0].replace("File:", "")
-                img_params = {
-                    "action": "query",
-                    "format": "json",
-                    "titles": f"File:{img_name}",
-                    "prop": "imageinfo",
-                    "iiprop": "url|size",
-                    "iiurlwidth": 500,  # Request a 500px width version
-                    "formatversion": 2
-                }
-                
-                img_response = await client.get(
-                    self.wikimedia_base_url,
-                    params=img_params,
-                    headers=headers,
-                    timeout=10.0
-                )
-                img_response.raise_for_status()
-                img_data = img_response.json()
-                
-                if img_data.get("query", {}).get("pages"):
-                    page = img_data["query"]["pages"][0]
-                    if page.get("imageinfo"):
-                        image_url = page["imageinfo"][0].get("thumburl")
-                        if image_url:
-                            print(f"Found image from Wikipedia: {image_url}")
-                            return image_url
-                
-                print(f"No image URL found for {player_name} on Wikipedia.")
-                return None
-                
-            except httpx.HTTPStatusError as e:
-                print(f"Wikipedia error response {e.response.status_code} while requesting {e.request.url!r}.")
-                return None
-            except httpx.RequestError as e:
-                print(f"Error requesting {e.request.url!r} from Wikipedia.")
-                return None
-            except (KeyError, IndexError) as e:
-                print(f"Error parsing Wikipedia response: {e}")
+        client = self._get_http_client()
+        try:
+            await self.rate_limiters["wikipedia"].wait()
+            response = await client.get(
+                self.wikimedia_base_url,
+                params=params,
+                headers=headers,
+                timeout=10.0
+            )
+            response.raise_for_status()
+            data = response.json()
+
+            pages = data.get("query", {}).get("pages", [])
+            if not pages:
+                print(f"No Wikipedia page found for {player_name}.")
                 return None
 
+            image_url = self._wikipedia_page_image(pages[0])
+            if image_url:
+                print(f"Found image from Wikipedia: {image_url}")
+                return image_url
+
+            print(f"No suitable image found for {player_name} on Wikipedia.")
+            return None
+            
+        except httpx.HTTPStatusError as e:
+            print(f"Wikipedia error response {e.response.status_code} while requesting {e.request.url!r}.")
+            return LOOKUP_FAILED
+        except httpx.RequestError as e:
+            print(f"Error requesting {e.request.url!r} from Wikipedia.")
+            return LOOKUP_FAILED
+        except (ValueError, KeyError, IndexError) as e:
+            print(f"Error parsing Wikipedia response: {e}")
+            return LOOKUP_FAILED
+
     async def download_player_image(self, player_name: str, image_url: str) -> str | None:
         """
         Downloads a player image to the local filesystem.
@@ -420,16 +725,16 @@ class SportsApiClient:
         
         try:
             # Download the image
-            async with httpx.AsyncClient() as client:
-                response = await client.get(image_url, timeout=30.0)
-                response.raise_for_status()
+            client = self._get_http_client()
+            response = await client.get(image_url, timeout=30.0)
+            response.raise_for_status()
                 
-                # Save to disk
-                with open(file_path, 'wb') as f:
-                    f.write(response.content)
+            # Save to disk
+            with open(file_path, 'wb') as f:
+                f.write(response.content)
                     
-                print(f"Image saved to {file_path}")
-                return str(file_path)
+            print(f"Image saved to {file_path}")
+            return str(file_path)
                 
         except httpx.HTTPStatusError as e:
             print(f"Error downloading image: {e.response.status_code} for URL {image_url}")
@@ -472,14 +777,13 @@ async def main():
     """
     Main function for testing the SportsApiClient.
     """
-    client = SportsApiClient()
-    
     # Test with multiple Arsenal players
     players = ["Bukayo Saka", "Martin Odegaard", "Declan Rice"]
     results = {}
     
-    for player in players:
-        results[player] = await test_player_image(client, player)
+    async with SportsApiClient() as client:
+        for player in players:
+            results[player] = await test_player_image(client, player)
     
     # Print summary
     print("\n--- Results Summary ---")
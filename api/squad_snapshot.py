@@ -0,0 +1,50 @@
+import os
+import time
+from typing import Any, Dict, List
+from player_index import PlayerNameIndex
+from state import load_json, save_json
+
+
+class SquadSnapshot:
+    """
+    A locally stored roster of one team (names and photos from API-Football)
+    that answers player lookups without a per-player API request.
+
+    Players are matched through a PlayerNameIndex, so accents, surnames
+    and small spelling differences still find the right squad member.
+    """
+    def __init__(self, team_id: int, ttl: float | None = None):
+        self.team_id = team_id
+        self.ttl = ttl or float(os.getenv("SQUAD_SNAPSHOT_TTL", str(24 * 3600)))
+        self.file_name = f"squad_{team_id}.json"
+        data = load_json(self.file_name, {})
+        self.fetched_at = data.get("fetched_at", 0)
+        self.players: List[Dict[str, Any]] = data.get("players", [])
+        self._build_index()
+
+    def is_stale(self) -> bool:
+        """Returns True if the snapshot is missing or older than its TTL."""
+        return not self.players or time.time() - self.fetched_at > self.ttl
+
+    def replace(self, players: List[Dict[str, Any]]):
+        """Stores a freshly fetched roster and rebuilds the name index."""
+        self.players = players
+        self.fetched_at = time.time()
+        self._build_index()
+        save_json(self.file_name, {"fetched_at": self.fetched_at, "players": self.players})
+
+    def _build_index(self):
+        self._by_id: Dict[str, Dict[str, Any]] = {str(player["id"]): player for player in self.players}
+        self._index = PlayerNameIndex()
+        for player in self.players:
+            self._index.add(str(player["id"]), player["names"])
+
+    def find(self, player_name: str) -> Dict[str, Any] | None:
+        """
+        Finds a squad member by name.
+
+        Returns:
+            The stored player record (with "photo"), or None if not in the squad.
+        """
+        player_id = self._index.resolve(player_name)
+        return self._by_id[player_id] if player_id else None
@@ -0,0 +1,39 @@
+import json
+import os
+from pathlib import Path
+
+# Directory holding state that must survive between hourly runs (feed
+# validators, cursors, caches). The GitHub Actions workflow restores and
+# saves this directory with actions/cache.
+STATE_DIR = Path(os.getenv("SCRAPER_STATE_DIR", ".scraper_state"))
+
+
+def state_path(name):
+    """Returns the path of a state file inside STATE_DIR."""
+    return STATE_DIR / name
+
+
+def load_json(name, default):
+    """
+    Loads a JSON state file, returning `default` if it is missing or corrupt.
+    A broken state file should only cost us a cache miss, never a failed run.
+    """
+    path = state_path(name)
+    if not path.exists():
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: could not read state file {path}: {e}")
+        return default
+
+
+def save_json(name, data):
+    """Atomically writes a JSON state file (write to a temp file, then rename)."""
+    path = state_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
@@ -0,0 +1,152 @@
+import os
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Set
+
+# Columns of the transfer_news table, as written by the pipeline
+TRANSFER_NEWS_COLUMNS = [
+    "player_name", "headline", "news_summary", "url", "source_name", "image_url", "published_at"
+]
+
+# Candidate URLs per existence query. PostgREST puts the `in` filter in the
+# query string, so keep batches small enough to stay under URL length limits.
+URL_LOOKUP_BATCH_SIZE = 50
+
+
+class TransferNewsStore(ABC):
+    """
+    Storage interface for the transfer_news table.
+
+    Implementations must keep the same semantics: `existing_urls` returns
+    which candidate URLs are already stored, and `upsert` inserts rows or
+    replaces the existing row with the same player_name. A backend missing
+    either method cannot be instantiated.
+    """
+    # Short backend name, used to keep per-backend pipeline state apart
+    name = "base"
+
+    @abstractmethod
+    def existing_urls(self, urls: Iterable[str]) -> Set[str]:
+        """Returns the subset of `urls` that is already stored."""
+
+    @abstractmethod
+    def upsert(self, rows: List[Dict[str, Any]]):
+        """Inserts rows, replacing any stored row with the same player_name."""
+
+    def is_transient(self, error: Exception) -> bool:
+        """Returns True if a failed write is worth retrying."""
+        return False
+
+
+class SupabaseStore(TransferNewsStore):
+    """The production store: the transfer_news table in Supabase."""
+    name = "supabase"
+
+    # Postgres error codes worth retrying: statement timeout, serialization
+    # failure and deadlock.
+    TRANSIENT_PG_CODES = {"57014", "40001", "40P01"}
+
+    def __init__(self, url: str, service_key: str):
+        from supabase import create_client
+        self.client = create_client(url, service_key)
+
+    def existing_urls(self, urls: Iterable[str]) -> Set[str]:
+        """
+        Queries only the candidate URLs (in batches), so the cost scales
+        with the batch rather than with the size of the table.
+        """
+        candidates = list(dict.fromkeys(urls))
+        existing = set()
+        for i in range(0, len(candidates), URL_LOOKUP_BATCH_SIZE):
+            batch = candidates[i:i + URL_LOOKUP_BATCH_SIZE]
+            response = self.client.table('transfer_news').select('url').in_('url', batch).execute()
+            existing.update(item['url'] for item in response.data)
+        return existing
+
+    def upsert(self, rows: List[Dict[str, Any]]):
+        self.client.table('transfer_news').upsert(rows, on_conflict='player_name').execute()
+
+    def is_transient(self, error: Exception) -> bool:
+        import httpx
+        from postgrest.exceptions import APIError
+        if isinstance(error, (httpx.TransportError, httpx.TimeoutException)):
+            return True
+        return isinstance(error, APIError) and error.code in self.TRANSIENT_PG_CODES
+
+
+class SQLiteStore(TransferNewsStore):
+    """
+    A local stand-in for Supabase with the same transfer_news schema, used
+    to run and benchmark the pipeline offline. The pipeline calls it from
+    worker threads, so one connection is shared behind a lock.
+    """
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS transfer_news (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                player_name TEXT UNIQUE,
+                headline TEXT,
+                news_summary TEXT,
+                url TEXT,
+                source_name TEXT,
+                image_url TEXT,
+                published_at TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS transfer_news_url ON transfer_news (url)")
+        self.conn.commit()
+
+    def existing_urls(self, urls: Iterable[str]) -> Set[str]:
+        candidates = list(dict.fromkeys(urls))
+        existing = set()
+        # Stay well below SQLite's bound-parameter limit
+        for i in range(0, len(candidates), 500):
+            batch = candidates[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                cursor = self.conn.execute(f"SELECT url FROM transfer_news WHERE url IN ({placeholders})", batch)
+                existing.update(row[0] for row in cursor)
+        return existing
+
+    def upsert(self, rows: List[Dict[str, Any]]):
+        columns = ", ".join(TRANSFER_NEWS_COLUMNS)
+        placeholders = ", ".join("?" * len(TRANSFER_NEWS_COLUMNS))
+        updates = ", ".join(f"{column} = excluded.{column}" for column in TRANSFER_NEWS_COLUMNS[1:])
+        with self._lock, self.conn:
+            self.conn.executemany(
+                f"INSERT INTO transfer_news ({columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT(player_name) DO UPDATE SET {updates}",
+                [tuple(row.get(column) for column in TRANSFER_NEWS_COLUMNS) for row in rows]
+            )
+
+    def is_transient(self, error: Exception) -> bool:
+        return isinstance(error, sqlite3.OperationalError) and "locked" in str(error)
+
+
+def create_store() -> TransferNewsStore:
+    """
+    Creates the store selected by STORAGE_BACKEND: "supabase" (default) or
+    "sqlite" (file at SQLITE_PATH).
+    """
+    backend = os.getenv("STORAGE_BACKEND", "supabase")
+    if backend == "sqlite":
+        path = os.getenv("SQLITE_PATH", ".scraper_state/transfer_news.db")
+        print(f"Using local SQLite store at {path}.")
+        return SQLiteStore(path)
+    if backend != "supabase":
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+    url = os.environ.get("SUPABASE_URL")
+    service_key = os.environ.get("SUPABASE_SERVICE_KEY")
+    assert url, "SUPABASE_URL not found in environment variables."
+    assert service_key, "SUPABASE_SERVICE_KEY not found in environment variables."
+    return SupabaseStore(url, service_key)
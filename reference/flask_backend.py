@@ -10,19 +10,33 @@ Author: Gemini Pro @ Cursor
 Date: 2024-05-21
 """
 
+import bisect
+import gzip
+import hashlib
 import json
 import logging
 import os
+import unicodedata
 from datetime import datetime, timezone, timedelta
 from typing import Dict, List, Any, Optional
-from threading import Thread
+from collections import OrderedDict
+from threading import Lock, Thread
 import time
 
-from flask import Flask, jsonify, request, render_template_string, send_from_directory
+from flask import Flask, Response, jsonify, request, render_template_string, send_from_directory
 from flask_cors import CORS
 from arsenal_scraper import main as run_all_scrapers, RUMORS_FILE, SOCIAL_MEDIA_FILE
 import asyncio
 
+# Brotli is optional; without it cached responses are offered as gzip only
+try:
+    import brotli
+except ImportError:
+    brotli = None
+# About as fast as gzip level 6 but smaller; the default quality (11) is far
+# too slow to run on every cache miss
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', '5'))
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -43,6 +57,17 @@ cached_data = {
 last_scrape_time = None
 scraping_in_progress = False
 
+# Indexes and stats derived from cached_data, rebuilt on every data reload
+data_index = {}
+# Bumped on every reload; cached responses belong to a single data version
+data_version = 0
+# Pre-serialized responses: cache key -> {"etag", "identity", "gzip", "br"},
+# least recently used first. Query strings are client-controlled, so only the
+# RESPONSE_CACHE_SIZE most recently used responses are kept.
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '256'))
+response_cache = OrderedDict()
+response_cache_lock = Lock()
+
 # Initialize scrapers
 # news_scraper = ArsenalNewsScraper()
 
@@ -72,6 +97,158 @@ def load_cached_data():
     except Exception as e:
         logger.error(f"Error loading social media cache: {e}")
 
+    rebuild_indexes()
+
+
+def _fold(text: str) -> str:
+    """Lowercases and strips accents so "Ødegaard" matches "odegaard"."""
+    text = unicodedata.normalize('NFKD', (text or '').replace('ø', 'o').replace('Ø', 'O'))
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def is_arsenal_related(item):
+    """Checks whether a rumor is about Arsenal or comes from an Arsenal-focused source."""
+    title = item.get('title', '').lower()
+    content = item.get('content', '').lower()
+    source = (item.get('source', '') or '').lower()
+    arsenal_sources = ['sky sports', 'the athletic', 'bbc sport', 'arsenal.com', 'espn']
+    if 'arsenal' in title or '#afc' in title or 'arsenal' in content or '#afc' in content:
+        return True
+    for s in arsenal_sources:
+        if s in source:
+            return True
+    return False
+
+
+def is_arsenal_tweet(item):
+    """Checks whether a social post mentions Arsenal."""
+    return 'arsenal' in item.get('content', '').lower() or '#afc' in item.get('content', '').lower()
+
+
+def _group_positions(values):
+    """Maps each distinct key to the (ascending) positions of the rumors that have it."""
+    groups = {}
+    for position, value in enumerate(values):
+        groups.setdefault(value, []).append(position)
+    return groups
+
+
+def rebuild_indexes():
+    """
+    Precomputes everything the read endpoints need from cached_data: the
+    Arsenal-filtered, newest-first timeline, per-field lookup indexes for
+    /api/rumors/filter, and the /api/stats distributions. Runs once per data
+    reload so requests only do lookups and slices.
+    """
+    global data_index, data_version
+    rumors = cached_data["rumors"]
+
+    # Timeline for /api/rumors
+    timeline = [dict(item, type='rumor') for item in rumors if is_arsenal_related(item)]
+    timeline += [dict(item, type='tweet') for item in cached_data["posts"] if is_arsenal_tweet(item)]
+    timeline.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+
+    # Filter indexes: key -> positions in rumors
+    by_reliability = sorted((r.get('reliability_score', 0), i) for i, r in enumerate(rumors))
+
+    # Stats for /api/stats
+    rumors_by_type, rumors_by_source, rumors_by_position = {}, {}, {}
+    for rumor in rumors:
+        rumor_type = rumor.get('rumor_type', 'unknown')
+        rumors_by_type[rumor_type] = rumors_by_type.get(rumor_type, 0) + 1
+        source = rumor.get('source', 'unknown')
+        rumors_by_source[source] = rumors_by_source.get(source, 0) + 1
+        position = rumor.get('position', 'unknown')
+        if position:
+            rumors_by_position[position] = rumors_by_position.get(position, 0) + 1
+    reliabilities = [r.get('reliability_score', 0) for r in rumors]
+
+    data_index = {
+        # The rumors the positions below refer to
+        'rumors': rumors,
+        'timeline': timeline,
+        'by_type': _group_positions(r.get('rumor_type') for r in rumors),
+        'by_position': _group_positions((r.get('position') or '').lower() for r in rumors),
+        'by_source': _group_positions((r.get('source') or '').lower() for r in rumors),
+        'by_player': _group_positions(_fold(r.get('player_name', '')) for r in rumors),
+        'reliability_scores': [score for score, _ in by_reliability],
+        'reliability_positions': [i for _, i in by_reliability],
+        'stats': {
+            'total_rumors': len(rumors),
+            'total_social_posts': len(cached_data["posts"]),
+            'rumors_by_type': rumors_by_type,
+            'rumors_by_source': rumors_by_source,
+            'rumors_by_position': rumors_by_position,
+            'average_reliability': sum(reliabilities) / len(reliabilities) if reliabilities else 0
+        }
+    }
+    data_version += 1
+    with response_cache_lock:
+        response_cache.clear()
+
+
+def _serialize(payload):
+    """Serializes a payload once, in compact, gzip and (if available) brotli form."""
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    entry = {
+        'etag': hashlib.sha256(body).hexdigest()[:32],
+        'identity': body,
+        'gzip': gzip.compress(body, compresslevel=6)
+    }
+    if brotli is not None:
+        entry['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return entry
+
+
+def cached_json_response(build_payload, params=()):
+    """
+    Returns a JSON response for the current request, serializing the payload
+    from `build_payload()` only once per data version, parsed query
+    parameters (`params`, the values the endpoint actually reads) and
+    scraping status, while it stays among the RESPONSE_CACHE_SIZE most
+    recently used responses. Other query arguments, such as a client's
+    cache-buster, do not affect the cache. Answers a matching If-None-Match
+    with 304 Not Modified.
+    """
+    key = (
+        request.path,
+        params,
+        data_version,
+        last_scrape_time,
+        scraping_in_progress
+    )
+    with response_cache_lock:
+        entry = response_cache.get(key)
+        if entry is not None:
+            response_cache.move_to_end(key)
+    if entry is None:
+        entry = _serialize(build_payload())
+        with response_cache_lock:
+            response_cache[key] = entry
+            while len(response_cache) > RESPONSE_CACHE_SIZE:
+                response_cache.popitem(last=False)
+
+    accepted = request.accept_encodings
+    if 'br' in entry and accepted['br']:
+        encoding = 'br'
+    elif accepted['gzip']:
+        encoding = 'gzip'
+    else:
+        encoding = 'identity'
+    # Each encoding is a different representation, so it gets its own strong ETag
+    etag = entry['etag'] if encoding == 'identity' else f"{entry['etag']}-{encoding}"
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(entry[encoding], mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 
 def should_refresh_data() -> bool:
     """Check if data should be refreshed based on age"""
@@ -122,30 +299,10 @@ def serve_index():
 def get_rumors():
     """Get all Arsenal transfer rumors and social media posts (Arsenal only)."""
     try:
-        # Arsenal filter function
-        def is_arsenal_related(item):
-            title = item.get('title', '').lower()
-            content = item.get('content', '').lower()
-            source = (item.get('source', '') or '').lower()
-            arsenal_sources = ['sky sports', 'the athletic', 'bbc sport', 'arsenal.com', 'espn']
-            if 'arsenal' in title or '#afc' in title or 'arsenal' in content or '#afc' in content:
-                return True
-            for s in arsenal_sources:
-                if s in source:
-                    return True
-            return False
-        def is_arsenal_tweet(item):
-            return 'arsenal' in item.get('content', '').lower() or '#afc' in item.get('content', '').lower()
-
-        # Add type and filter rumors
-        rumors = [dict(item, type='rumor') for item in cached_data["rumors"] if is_arsenal_related(item)]
-        tweets = [dict(item, type='tweet') for item in cached_data["posts"] if is_arsenal_tweet(item)]
-        all_items = rumors + tweets
-        # Sort newest first
-        all_items.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-        return jsonify({
+        # Filtered and sorted newest first on every data reload
+        return cached_json_response(lambda: {
             'status': 'success',
-            'data': all_items,
+            'data': data_index.get('timeline', []),
             'last_updated': last_scrape_time,
             'scraping_status': 'in_progress' if scraping_in_progress else 'idle'
         })
@@ -161,17 +318,63 @@ def get_latest_rumors():
         limit = request.args.get('limit', 10, type=int)
         limited_rumors = cached_data["rumors"][:limit]
         
-        return jsonify({
+        return cached_json_response(lambda: {
             'success': True,
             'data': limited_rumors,
             'total': len(limited_rumors),
             'last_updated': last_scrape_time
-        })
+        }, params=(limit,))
     except Exception as e:
         logger.error(f"Error in get_latest_rumors: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def _filtered_rumors_payload(rumor_type, position, source, min_reliability, player_name):
+    """Builds the /api/rumors/filter payload from the precomputed indexes."""
+    # One snapshot of the indexes and the rumors they point into, so a data
+    # reload during the request cannot mix positions from one with the other
+    index = data_index
+    # Each filter narrows a set of positions in index["rumors"]
+    matches = []
+    if rumor_type:
+        matches.append(set(index.get('by_type', {}).get(rumor_type, [])))
+    
+    if position:
+        matches.append(set(index.get('by_position', {}).get(position.lower(), [])))
+    
+    if source:
+        # Substring match over the distinct sources, not every rumor
+        source_key = source.lower()
+        matches.append({i for key, ids in index.get('by_source', {}).items() if source_key in key for i in ids})
+    
+    if min_reliability:
+        start = bisect.bisect_left(index.get('reliability_scores', []), min_reliability)
+        matches.append(set(index.get('reliability_positions', [])[start:]))
+    
+    if player_name:
+        player = _fold(player_name)
+        matches.append({i for key, ids in index.get('by_player', {}).items() if player in key for i in ids})
+    
+    rumors = index.get('rumors', [])
+    if matches:
+        filtered_rumors = [rumors[i] for i in sorted(set.intersection(*matches))]
+    else:
+        filtered_rumors = list(rumors)
+    
+    return {
+        'success': True,
+        'data': filtered_rumors,
+        'total': len(filtered_rumors),
+        'filters_applied': {
+            'type': rumor_type,
+            'position': position,
+            'source': source,
+            'min_reliability': min_reliability,
+            'player': player_name
+        }
+    }
+
+
 @app.route('/api/rumors/filter', methods=['GET'])
 def filter_rumors():
     """Filter rumors by various criteria"""
@@ -183,36 +386,10 @@ def filter_rumors():
         min_reliability = request.args.get('min_reliability', type=int)
         player_name = request.args.get('player')
         
-        filtered_rumors = cached_data["rumors"].copy()
-        
-        # Apply filters
-        if rumor_type:
-            filtered_rumors = [r for r in filtered_rumors if r.get('rumor_type') == rumor_type]
-        
-        if position:
-            filtered_rumors = [r for r in filtered_rumors if r.get('position', '').lower() == position.lower()]
-        
-        if source:
-            filtered_rumors = [r for r in filtered_rumors if source.lower() in r.get('source', '').lower()]
-        
-        if min_reliability:
-            filtered_rumors = [r for r in filtered_rumors if r.get('reliability_score', 0) >= min_reliability]
-        
-        if player_name:
-            filtered_rumors = [r for r in filtered_rumors if player_name.lower() in r.get('player_name', '').lower()]
-        
-        return jsonify({
-            'success': True,
-            'data': filtered_rumors,
-            'total': len(filtered_rumors),
-            'filters_applied': {
-                'type': rumor_type,
-                'position': position,
-                'source': source,
-                'min_reliability': min_reliability,
-                'player': player_name
-            }
-        })
+        return cached_json_response(
+            lambda: _filtered_rumors_payload(rumor_type, position, source, min_reliability, player_name),
+            params=(rumor_type, position, source, min_reliability, player_name)
+        )
         
     except Exception as e:
         logger.error(f"Error in filter_rumors: {e}")
@@ -226,12 +403,12 @@ def get_social_media():
         limit = request.args.get('limit', 20, type=int)
         limited_posts = cached_data["posts"][:limit]
         
-        return jsonify({
+        return cached_json_response(lambda: {
             'success': True,
             'data': limited_posts,
             'total': len(limited_posts),
             'last_updated': last_scrape_time
-        })
+        }, params=(limit,))
     except Exception as e:
         logger.error(f"Error in get_social_media: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -241,38 +418,14 @@ def get_social_media():
 def get_statistics():
     """Get various statistics about the data"""
     try:
-        stats = {
-            'total_rumors': len(cached_data["rumors"]),
-            'total_social_posts': len(cached_data["posts"]),
-            'last_updated': last_scrape_time,
-            'scraping_status': 'in_progress' if scraping_in_progress else 'idle',
-            'rumors_by_type': {},
-            'rumors_by_source': {},
-            'rumors_by_position': {},
-            'average_reliability': 0
-        }
+        # Distributions are precomputed on data reload; only the live status is added here
+        stats = dict(
+            data_index.get('stats', {}),
+            last_updated=last_scrape_time,
+            scraping_status='in_progress' if scraping_in_progress else 'idle'
+        )
         
-        if cached_data["rumors"]:
-            # Calculate distributions
-            for rumor in cached_data["rumors"]:
-                # By type
-                rumor_type = rumor.get('rumor_type', 'unknown')
-                stats['rumors_by_type'][rumor_type] = stats['rumors_by_type'].get(rumor_type, 0) + 1
-                
-                # By source
-                source = rumor.get('source', 'unknown')
-                stats['rumors_by_source'][source] = stats['rumors_by_source'].get(source, 0) + 1
-                
-                # By position
-                position = rumor.get('position', 'unknown')
-                if position:
-                    stats['rumors_by_position'][position] = stats['rumors_by_position'].get(position, 0) + 1
-            
-            # Calculate average reliability
-            reliabilities = [r.get('reliability_score', 0) for r in cached_data["rumors"]]
-            stats['average_reliability'] = sum(reliabilities) / len(reliabilities) if reliabilities else 0
-        
-        return jsonify({
+        return cached_json_response(lambda: {
             'success': True,
             'data': stats
         })